@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+
+# Column order of a parsed car (see listing_parser.new_car_info), id is added last
+STRING_COLUMNS = ('link', 'image_url', 'additional_info')
+INT_COLUMNS = ('year', 'mileage', 'price', 'age', 'km_per_year')
+CAR_COLUMNS = ('name', 'link', 'image_url', 'additional_info', 'year', 'mileage', 'price', 'age', 'km_per_year', 'id')
+
+SOLD = "Solgt"
+_MISSING = -2 ** 40  # Stand-in for a missing number while converting, outside the int32 range
+_INT32 = np.iinfo(np.int32)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool) and value == value
+
+
+def as_number(value):
+    """A car field as a number the way pd.to_numeric(errors="coerce") reads it, None when it is not one
+
+    Numeric strings such as "250000" are converted, fractional values are kept.
+    """
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return None
+        return int(value) if value.is_integer() else (value if value == value else None)
+    if not _is_number(value):
+        return None
+    return value.item() if isinstance(value, (np.integer, np.floating)) else value
+
+
+class CarRecordBatch:
+    """Columnar batch of parsed cars
+
+    Numbers are int32 arrays with a validity mask each (float64 for a column
+    that holds fractional values), the "Solgt" price is a
+    sold bitmask (its price slot is null), and names are dictionary encoded:
+    name_codes index into name_dictionary, -1 for a missing name.
+    """
+
+    def __init__(self, ids, name_codes, name_dictionary, strings, values, valid, sold):
+        self.ids = ids
+        self.name_codes = name_codes
+        self.name_dictionary = name_dictionary
+        self.strings = strings
+        self.values = values
+        self.valid = valid
+        self.sold = sold
+
+    @classmethod
+    def from_cars(cls, cars: list):
+        """Build a batch from parser output (a list of car dicts)"""
+        count = len(cars)
+        name_index = {}
+        name_codes = np.fromiter(
+            (-1 if car.get('name') is None else name_index.setdefault(car['name'], len(name_index)) for car in cars),
+            dtype=np.int32, count=count
+        )
+        ids = np.fromiter(
+            (car['id'] if _is_number(car.get('id')) else 0 for car in cars), dtype=np.int32, count=count
+        )
+        strings = {
+            column: np.array([car.get(column) for car in cars], dtype=object)
+            for column in STRING_COLUMNS
+        }
+        values = {}
+        valid = {}
+        for column in INT_COLUMNS:
+            numbers = [
+                value if type(value) is int else as_number(value)
+                for value in (car.get(column) for car in cars)
+            ]
+            valid[column] = np.fromiter((number is not None for number in numbers), dtype=bool, count=count)
+            if any(type(number) is float and not number.is_integer() for number in numbers):
+                values[column] = np.array([0.0 if number is None else number for number in numbers], dtype=np.float64)
+                continue
+            numbers = np.array([_MISSING if number is None else int(number) for number in numbers], dtype=np.int64)
+            if count and not ((numbers >= _INT32.min) & (numbers <= _INT32.max) | ~valid[column]).all():
+                raise ValueError(f"'{column}' has values outside the int32 range")
+            values[column] = np.where(valid[column], numbers, 0).astype(np.int32)
+        sold = np.fromiter((car.get('price') == SOLD for car in cars), dtype=bool, count=count)
+        return cls(ids, name_codes, list(name_index), strings, values, valid, sold)
+
+    @classmethod
+    def concat(cls, batches: list):
+        """Join batches (e.g. one per result page), re-encoding the names"""
+        if not batches:
+            return cls.from_cars([])
+        name_index = {}
+        name_codes = []
+        for batch in batches:
+            remap = np.array(
+                [name_index.setdefault(name, len(name_index)) for name in batch.name_dictionary] + [-1],
+                dtype=np.int32
+            )
+            # -1 (missing) picks the trailing -1 of the remap table
+            name_codes.append(remap[batch.name_codes])
+        return cls(
+            np.concatenate([batch.ids for batch in batches]),
+            np.concatenate(name_codes),
+            list(name_index),
+            {column: np.concatenate([batch.strings[column] for batch in batches]) for column in STRING_COLUMNS},
+            {column: np.concatenate([batch.values[column] for batch in batches]) for column in INT_COLUMNS},
+            {column: np.concatenate([batch.valid[column] for batch in batches]) for column in INT_COLUMNS},
+            np.concatenate([batch.sold for batch in batches])
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def slice(self, start: int, stop: int):
+        """Rows start:stop as a batch sharing this batch's arrays and name dictionary"""
+        return CarRecordBatch(
+            self.ids[start:stop], self.name_codes[start:stop], self.name_dictionary,
+            {column: array[start:stop] for column, array in self.strings.items()},
+            {column: array[start:stop] for column, array in self.values.items()},
+            {column: array[start:stop] for column, array in self.valid.items()},
+            self.sold[start:stop]
+        )
+
+    def names(self):
+        return np.array(self.name_dictionary + [None], dtype=object)[self.name_codes]
+
+    def numeric(self, column: str):
+        """Column as float64 with NaN for missing values (and for sold cars' price)"""
+        return np.where(self.valid[column], self.values[column], np.nan)
+
+    def has_values(self, column: str) -> bool:
+        return bool(self.valid[column].any())
+
+    def to_cars(self) -> list:
+        """Back to the list of car dicts the parser produces"""
+        names = self.names()
+        columns = {column: self.strings[column].tolist() for column in STRING_COLUMNS}
+        for column in INT_COLUMNS:
+            columns[column] = [
+                value if ok else None
+                for value, ok in zip(self.values[column].tolist(), self.valid[column].tolist())
+            ]
+        columns['price'] = [SOLD if sold else price for price, sold in zip(columns['price'], self.sold.tolist())]
+        columns['name'] = names.tolist()
+        columns['id'] = self.ids.tolist()
+        return [dict(zip(CAR_COLUMNS, row)) for row in zip(*(columns[column] for column in CAR_COLUMNS))]
+
+    def to_pandas(self) -> pd.DataFrame:
+        """DataFrame with numeric price and a boolean sold column
+
+        Number columns are int64 when complete and float64 with NaN (or fractional
+        values) otherwise, the same dtypes pd.DataFrame(cars) infers.
+        """
+        data = {'name': self.names()}
+        data.update(self.strings)
+        for column in INT_COLUMNS:
+            if self.valid[column].all() and self.values[column].dtype.kind == 'i':
+                data[column] = self.values[column].astype(np.int64)
+            else:
+                data[column] = self.numeric(column)
+        data['id'] = self.ids.astype(np.int64)
+        data['sold'] = self.sold
+        return pd.DataFrame(data)
+
+    def to_arrow(self):
+        """pyarrow Table with nulls for missing values and a dictionary-encoded name column"""
+        import pyarrow as pa
+
+        columns = {
+            'name': pa.DictionaryArray.from_arrays(
+                pa.array(self.name_codes, mask=self.name_codes < 0), pa.array(self.name_dictionary, type=pa.string())
+            )
+        }
+        for column in STRING_COLUMNS:
+            columns[column] = pa.array(self.strings[column], type=pa.string())
+        for column in INT_COLUMNS:
+            columns[column] = pa.array(self.values[column], mask=~self.valid[column])
+        columns['id'] = pa.array(self.ids)
+        columns['sold'] = pa.array(self.sold)
+        return pa.table(columns)
+
+    @classmethod
+    def from_arrow(cls, table):
+        """Rebuild a batch from a table written by to_arrow"""
+        import pyarrow.compute as pc
+
+        def column(name):
+            return table.column(name).combine_chunks()
+
+        names = column('name')
+        name_codes = pc.fill_null(names.indices, -1).to_numpy().astype(np.int32)
+        strings = {name: column(name).to_numpy(zero_copy_only=False).astype(object) for name in STRING_COLUMNS}
+        values = {}
+        valid = {}
+        for name in INT_COLUMNS:
+            array = column(name)
+            valid[name] = array.is_valid().to_numpy(zero_copy_only=False)
+            numbers = pc.fill_null(array, 0).to_numpy()
+            values[name] = numbers if numbers.dtype.kind == 'f' else numbers.astype(np.int32)
+        return cls(
+            column('id').to_numpy().astype(np.int32), name_codes, names.dictionary.to_pylist(),
+            strings, values, valid, column('sold').to_numpy(zero_copy_only=False)
+        )
@@ -0,0 +1,203 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from listing_parser import finn_item_id
+from mcp_servers.car_database import get_car_database, model_key
+
+FEATURES = ('year', 'mileage', 'price', 'km_per_year')
+DEFAULT_K = 5
+REBUILD_MIN = 256  # Buffered or replaced listings tolerated before the trees are rebuilt...
+REBUILD_FRACTION = 0.1  # ...or this share of the indexed listings, whichever is larger
+REFRESH_INTERVAL = 30  # Seconds between checks for newly stored listings
+
+
+def feature_vector(car: dict):
+    """(year, mileage, price, km_per_year) of a car, deriving km_per_year from age when missing
+
+    Returns None when year, mileage or price is not a number.
+    """
+    values = [car.get(feature) for feature in FEATURES]
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values[:3]):
+        return None
+    if not isinstance(values[3], (int, float)):
+        age = car.get('age') if isinstance(car.get('age'), (int, float)) else datetime.now().year - values[0]
+        values[3] = values[1] / max(age, 1)
+    return np.array(values, dtype=float)
+
+
+class ComparablesIndex:
+    """Nearest-neighbour index over (year, mileage, price, km_per_year) of unsold listings
+
+    Features are divided by their standard deviation so one year counts as
+    much as the typical spread in price. There is a KD-tree per model and one
+    over all listings; a query searches the car's own model first and the
+    whole market when the model has fewer than k listings.
+
+    Listings stored after the last build go to a small buffer that is searched
+    exactly, and replaced or sold listings are masked in the trees, so new
+    scrapes are visible at once. The trees are rebuilt when the buffer and
+    masked rows outgrow REBUILD_MIN or REBUILD_FRACTION of the index, and on
+    every change while the index holds fewer than REBUILD_MIN listings.
+    """
+
+    def __init__(self):
+        self.item_ids = []
+        self.models = np.array([], dtype=object)
+        self.raw = np.empty((0, len(FEATURES)))
+        self.scale = np.ones(len(FEATURES))
+        self.trees = {}  # model_key (None for all listings) -> (cKDTree, tree row numbers)
+        self.positions = {}  # item_id -> tree row
+        self.masked = set()  # Tree rows replaced by a newer version or sold
+        self.buffer = {}  # item_id -> (model_key, raw features), not in the trees yet
+        self.seen_until = 0.0
+        self._buffer_arrays = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.item_ids) - len(self.masked) + len(self.buffer)
+
+    def upsert(self, rows: list):
+        """Apply (item_id, model_key, year, mileage, price, km_per_year, sold, last_seen) rows"""
+        with self._lock:
+            for item_id, model, year, mileage, price, km_per_year, sold, last_seen in rows:
+                self.seen_until = max(self.seen_until, last_seen or 0)
+                vector = None if sold else feature_vector(
+                    {'year': year, 'mileage': mileage, 'price': price, 'km_per_year': km_per_year}
+                )
+                row = self.positions.get(item_id)
+                if row is not None:
+                    # A re-scrape touches every listing; unchanged ones keep their tree row
+                    if vector is not None and self.models[row] == model and np.array_equal(self.raw[row], vector):
+                        continue
+                    self.masked.add(self.positions.pop(item_id))
+                self.buffer.pop(item_id, None)
+                if vector is not None:
+                    self.buffer[item_id] = (model, vector)
+            self._buffer_arrays = None
+            pending = len(self.buffer) + len(self.masked)
+            # Small indexes are rebuilt on every change, so the trees and feature scale always
+            # cover every listing; rebuilding them costs less than searching the buffer unscaled
+            if pending and (len(self.item_ids) < REBUILD_MIN or
+                            pending > max(REBUILD_MIN, REBUILD_FRACTION * len(self.item_ids))):
+                self._rebuild()
+
+    def _rebuild(self):
+        from scipy.spatial import cKDTree
+
+        live = [row for row in range(len(self.item_ids)) if row not in self.masked]
+        item_ids = [self.item_ids[row] for row in live] + list(self.buffer)
+        models = np.array([self.models[row] for row in live] + [model for model, _ in self.buffer.values()], dtype=object)
+        raw = np.vstack([self.raw[live]] + [vector[None, :] for _, vector in self.buffer.values()])
+
+        self.item_ids = item_ids
+        self.models = models
+        self.raw = raw
+        self.scale = np.where(raw.std(axis=0) > 0, raw.std(axis=0), 1.0) if len(raw) else np.ones(len(FEATURES))
+        scaled = raw / self.scale
+        self.trees = {}
+        if len(raw):
+            self.trees[None] = (cKDTree(scaled), np.arange(len(raw)))
+            for model in set(models) - {None}:
+                rows = np.flatnonzero(models == model)
+                self.trees[model] = (cKDTree(scaled[rows]), rows)
+        self.positions = {item_id: row for row, item_id in enumerate(item_ids)}
+        self.masked = set()
+        self.buffer = {}
+        self._buffer_arrays = None
+
+    def _search_tree(self, model, target, k, exclude):
+        if model not in self.trees:
+            return []
+        tree, rows = self.trees[model]
+        # Ask for enough extra neighbours to survive dropping masked rows and the car itself
+        count = min(k + len(self.masked) + 1, len(rows))
+        distances, indices = tree.query(target, k=count)
+        found = []
+        for distance, index in zip(np.atleast_1d(distances).tolist(), np.atleast_1d(indices).tolist()):
+            row = int(rows[index])
+            if row in self.masked or self.item_ids[row] == exclude:
+                continue
+            found.append((distance, self.item_ids[row]))
+        return found[:k]
+
+    def _search_buffer(self, model, target, k, exclude):
+        if not self.buffer:
+            return []
+        if self._buffer_arrays is None:
+            self._buffer_arrays = (
+                list(self.buffer),
+                np.array([buffered_model for buffered_model, _ in self.buffer.values()], dtype=object),
+                np.vstack([vector for _, vector in self.buffer.values()])
+            )
+        item_ids, models, raw = self._buffer_arrays
+        distances = np.linalg.norm(raw / self.scale - target, axis=1)
+        candidates = np.flatnonzero(models == model) if model is not None else np.arange(len(item_ids))
+        candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+        return [(float(distances[index]), item_ids[index]) for index in candidates
+                if item_ids[index] != exclude][:k]
+
+    def query(self, car: dict, k: int = DEFAULT_K, exclude: str = None) -> list:
+        """[(distance, item_id)] of the k listings closest to a car, nearest first"""
+        vector = feature_vector(car)
+        if vector is None:
+            raise ValueError("The car needs numeric year, mileage and price to find comparables")
+        with self._lock:
+            target = vector / self.scale
+            model = model_key(car.get('name'))
+            found = []
+            if model is not None:
+                found = self._search_tree(model, target, k, exclude) + self._search_buffer(model, target, k, exclude)
+            if len(found) < k:
+                # Too few of the same model: compare against the whole market
+                found = self._search_tree(None, target, k, exclude) + self._search_buffer(None, target, k, exclude)
+            return sorted(found)[:k]
+
+
+_index = None
+_index_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def get_comparables_index(database=None) -> ComparablesIndex:
+    """The comparables index, updated with listings stored since the last refresh"""
+    global _index, _last_refresh
+    with _index_lock:
+        if _index is None:
+            _index = ComparablesIndex()
+        if time.time() - _last_refresh >= REFRESH_INTERVAL:
+            _last_refresh = time.time()
+            rows = (database or get_car_database()).listings_seen_since(_index.seen_until)
+            if rows:
+                _index.upsert(rows)
+        return _index
+
+
+def find_comparables(car: dict = None, item_id: str = None, k: int = DEFAULT_K, database=None) -> dict:
+    """The k stored listings most like a car, given as a car object or as a stored item id"""
+    database = database or get_car_database()
+    index = get_comparables_index(database)
+    if item_id is not None:
+        item_id = finn_item_id(item_id) or item_id
+        stored = database.get_listing(item_id)["listing"]
+        if stored is None:
+            raise ValueError(f"Unknown listing: {item_id}")
+        car = stored
+    if car is None:
+        raise ValueError("Either car_data or item_id is required")
+
+    start = time.perf_counter()
+    neighbours = index.query(car, k, exclude=item_id)
+    query_ms = (time.perf_counter() - start) * 1000
+    listings = database.listings_by_id([neighbour_id for _, neighbour_id in neighbours])
+    return {
+        "car": car,
+        "comparables": [
+            {**listings[neighbour_id], "distance": round(distance, 4)}
+            for distance, neighbour_id in neighbours if neighbour_id in listings
+        ],
+        "indexed_listings": len(index),
+        "query_ms": round(query_ms, 3)
+    }
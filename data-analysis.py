@@ -5,6 +5,12 @@ import numpy as np
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 from typing import List, Dict, Any
+from market_analysis import cached_analysis, analysis_cache, get_market_stats
+from dataset_registry import register_dataset, resolve_cars
+from depreciation import get_depreciation_model, fit_depreciation_model, depreciation_table
+from fair_price import get_fair_price_model
+from comparables import find_comparables, DEFAULT_K
+from value_scoring import select_best_deals, get_scoring_profile, SCORING_PROFILES, DEFAULT_TOP_K
 
 app = Server("data_analyzer")
 
@@ -18,9 +24,9 @@ async def list_tools():
                 "type": "object",
                 "properties": {
                     "cars_data": {"type": "array", "description": "Array of car objects"},
+                    "dataset_id": {"type": "string", "description": "Dataset returned by fetch_finn_data or register_dataset, instead of cars_data"},
                     "analysis_type": {"type": "string", "enum": ["basic", "detailed", "investment"], "default": "basic"}
-                },
-                "required": ["cars_data"]
+                }
             }
         ),
         Tool(
@@ -30,13 +36,83 @@ async def list_tools():
                 "type": "object",
                 "properties": {
                     "cars_data": {"type": "array"},
+                    "dataset_id": {"type": "string", "description": "Dataset returned by fetch_finn_data or register_dataset, instead of cars_data"},
                     "max_price": {"type": "integer"},
                     "max_mileage": {"type": "integer"},
-                    "min_year": {"type": "integer"}
+                    "min_year": {"type": "integer"},
+                    "top_k": {"type": "integer", "default": DEFAULT_TOP_K, "description": "Number of deals to return"},
+                    "use_fair_price": {"type": "boolean", "default": True, "description": "Add fair_price and discount_vs_market from listings in the car database and break score ties by discount"},
+                    "scoring_profile": {
+                        "oneOf": [
+                            {"type": "string", "enum": list(SCORING_PROFILES)},
+                            {"type": "object", "description": "Thresholds and weights overriding the default profile"}
+                        ],
+                        "default": "default"
+                    }
+                }
+            }
+        ),
+        Tool(
+            name="register_dataset",
+            description="Store cars once and get a dataset_id to pass to the analysis tools",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "cars_data": {"type": "array", "description": "Array of car objects"}
                 },
                 "required": ["cars_data"]
             }
         ),
+        Tool(
+            name="update_market_stats",
+            description="Keep market statistics for a polled search up to date from added and removed listings instead of re-analyzing every car",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "market_key": {"type": "string", "description": "Name of the market view, e.g. the search_key from fetch_finn_changes"},
+                    "cars_data": {"type": "array", "description": "New or updated car objects"},
+                    "removed": {"type": "array", "description": "Car objects or Finn item ids no longer listed"},
+                    "changes": {"type": "object", "description": "A fetch_finn_changes result to ingest"},
+                    "reset": {"type": "boolean", "default": False, "description": "Start the view from scratch"},
+                    "analysis_type": {"type": "string", "enum": ["basic", "detailed", "investment"], "default": "basic"}
+                },
+                "required": ["market_key"]
+            }
+        ),
+        Tool(
+            name="get_analysis_cache_stats",
+            description="Show hit/miss counters and size of the analyze_car_market result cache",
+            inputSchema={"type": "object", "properties": {}}
+        ),
+        Tool(
+            name="find_comparable_cars",
+            description="Find the stored listings most similar to a car by year, mileage, price, km per year and model",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "car_data": {"type": "object", "description": "Car object with at least year, mileage and price"},
+                    "item_id": {"type": "string", "description": "Finn item id or listing URL of a stored listing, instead of car_data"},
+                    "k": {"type": "integer", "default": DEFAULT_K, "description": "Number of comparable cars to return"}
+                }
+            }
+        ),
+        Tool(
+            name="predict_depreciation_batch",
+            description="Predict the value of many cars over the coming years in one call, as a cars x years table",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "cars_data": {"type": "array", "description": "Array of car objects"},
+                    "dataset_id": {"type": "string", "description": "Dataset returned by fetch_finn_data or register_dataset, instead of cars_data"},
+                    "years_ahead": {"type": "integer", "default": 3}
+                }
+            }
+        ),
+        Tool(
+            name="fit_depreciation_model",
+            description="Refit the per-model depreciation curves on all listings in the car database",
+            inputSchema={"type": "object", "properties": {}}
+        ),
         Tool(
             name="predict_depreciation",
             description="Predict car value depreciation based on historical data",
@@ -54,41 +130,31 @@ async def list_tools():
 @app.call_tool()
 async def call_tool(name: str, arguments: dict):
     if name == "analyze_car_market":
-        return await analyze_car_market(arguments["cars_data"], arguments.get("analysis_type", "basic"))
+        return await analyze_car_market(
+            arguments.get("cars_data"), arguments.get("analysis_type", "basic"), arguments.get("dataset_id")
+        )
     elif name == "find_best_deals":
         return await find_best_deals(arguments)
+    elif name == "register_dataset":
+        return await register_cars_dataset(arguments["cars_data"])
+    elif name == "update_market_stats":
+        return await update_market_stats(arguments)
+    elif name == "get_analysis_cache_stats":
+        return [TextContent(type="text", text=json.dumps(analysis_cache.get_stats()))]
+    elif name == "find_comparable_cars":
+        return await find_comparable_cars(arguments)
+    elif name == "predict_depreciation_batch":
+        return await predict_depreciation_batch(arguments)
+    elif name == "fit_depreciation_model":
+        return await refit_depreciation_model()
     elif name == "predict_depreciation":
         return await predict_depreciation(arguments["car_data"], arguments.get("years_ahead", 3))
 
-async def analyze_car_market(cars_data: List[Dict], analysis_type: str = "basic"):
+async def analyze_car_market(cars_data: List[Dict] = None, analysis_type: str = "basic", dataset_id: str = None):
     try:
-        df = pd.DataFrame(cars_data)
-        
-        # Filter out sold cars for price analysis
-        available_cars = df[df['price'] != 'Solgt'].copy()
-        available_cars['price'] = pd.to_numeric(available_cars['price'], errors='coerce')
+        # Identical input is answered from the result cache instead of being recomputed
+        analysis = cached_analysis(cars_data, analysis_type, dataset_id)
         
-        analysis = {
-            "total_cars": len(df),
-            "available_cars": len(available_cars),
-            "sold_cars": len(df[df['price'] == 'Solgt']),
-            "avg_price": float(available_cars['price'].mean()) if not available_cars.empty else None,
-            "median_price": float(available_cars['price'].median()) if not available_cars.empty else None,
-            "price_range": {
-                "min": float(available_cars['price'].min()) if not available_cars.empty else None,
-                "max": float(available_cars['price'].max()) if not available_cars.empty else None
-            },
-            "avg_mileage": float(df['mileage'].mean()) if 'mileage' in df.columns else None,
-            "avg_age": float(df['age'].mean()) if 'age' in df.columns else None
-        }
-        
-        if analysis_type == "detailed":
-            analysis.update({
-                "mileage_distribution": df['mileage'].describe().to_dict() if 'mileage' in df.columns else None,
-                "year_distribution": df['year'].value_counts().to_dict() if 'year' in df.columns else None,
-                "price_per_km": calculate_price_per_km(available_cars)
-            })
-            
         return [TextContent(
             type="text",
             text=json.dumps(analysis, ensure_ascii=False, default=str)
@@ -100,51 +166,57 @@ async def analyze_car_market(cars_data: List[Dict], analysis_type: str = "basic"
             text=json.dumps({"error": str(e)})
         )]
 
-def calculate_price_per_km(df):
-    """Calculate price per kilometer for available cars"""
-    if 'price' in df.columns and 'mileage' in df.columns:
-        valid_data = df[(df['price'].notna()) & (df['mileage'].notna()) & (df['mileage'] > 0)]
-        if not valid_data.empty:
-            valid_data = valid_data.copy()
-            valid_data['price_per_km'] = valid_data['price'] / valid_data['mileage']
-            return float(valid_data['price_per_km'].mean())
-    return None
+async def update_market_stats(arguments: dict):
+    """Apply listing deltas to a market view and return its analysis"""
+    try:
+        stats = get_market_stats(arguments["market_key"], arguments.get("reset", False))
+        if arguments.get("changes"):
+            stats.apply_changes(arguments["changes"])
+        stats.add(arguments.get("cars_data") or [])
+        stats.remove(arguments.get("removed") or [])
+        analysis = stats.analysis(arguments.get("analysis_type", "basic"))
+        
+        return [TextContent(
+            type="text",
+            text=json.dumps({"market_key": arguments["market_key"], **analysis}, ensure_ascii=False, default=str)
+        )]
+        
+    except Exception as e:
+        return [TextContent(
+            type="text",
+            text=json.dumps({"error": str(e)})
+        )]
 
 async def find_best_deals(arguments: dict):
     """Find best car deals based on criteria"""
     try:
-        cars_data = arguments["cars_data"]
+        cars_data = resolve_cars(arguments)
         max_price = arguments.get("max_price")
         max_mileage = arguments.get("max_mileage")  
         min_year = arguments.get("min_year")
+        profile = get_scoring_profile(arguments.get("scoring_profile"))
+        top_k = arguments.get("top_k", DEFAULT_TOP_K)
         
-        df = pd.DataFrame(cars_data)
-        
-        # Filter available cars
-        filtered_cars = df[df['price'] != 'Solgt'].copy()
-        filtered_cars['price'] = pd.to_numeric(filtered_cars['price'], errors='coerce')
+        # Filter, score and rank chunk by chunk, keeping only the top_k cars in memory;
+        # ties on value score go to the car priced furthest below comparable listings
+        fair_price_model = None
+        if arguments.get("use_fair_price", True):
+            # Refreshing the model reads the database and saves it to disk
+            fair_price_model = await asyncio.to_thread(get_fair_price_model)
+        best_deals, total_matches = select_best_deals(
+            cars_data, max_price, max_mileage, min_year, profile, top_k, fair_price_model=fair_price_model
+        )
         
-        # Apply filters
-        if max_price:
-            filtered_cars = filtered_cars[filtered_cars['price'] <= max_price]
-        if max_mileage:
-            filtered_cars = filtered_cars[filtered_cars['mileage'] <= max_mileage]
-        if min_year:
-            filtered_cars = filtered_cars[filtered_cars['year'] >= min_year]
-            
-        # Calculate value scores
-        if not filtered_cars.empty:
-            filtered_cars['value_score'] = calculate_value_score(filtered_cars)
-            best_deals = filtered_cars.nlargest(5, 'value_score')
-            
+        if total_matches:
             result = {
-                "best_deals": best_deals.to_dict('records'),
+                "best_deals": best_deals,
                 "criteria_applied": {
                     "max_price": max_price,
                     "max_mileage": max_mileage,
-                    "min_year": min_year
+                    "min_year": min_year,
+                    "scoring_profile": profile.to_dict()
                 },
-                "total_matches": len(filtered_cars)
+                "total_matches": total_matches
             }
         else:
             result = {"best_deals": [], "message": "No cars match the criteria"}
@@ -160,6 +232,69 @@ async def find_best_deals(arguments: dict):
             text=json.dumps({"error": str(e)})
         )]
 
+async def register_cars_dataset(cars_data: List[Dict]):
+    """Register cars under a dataset_id so later tool calls do not resend them"""
+    try:
+        dataset_id = register_dataset(cars_data)
+        return [TextContent(
+            type="text",
+            text=json.dumps({"success": True, "dataset_id": dataset_id, "cars": len(cars_data)})
+        )]
+        
+    except Exception as e:
+        return [TextContent(
+            type="text",
+            text=json.dumps({"error": str(e)})
+        )]
+
+async def find_comparable_cars(arguments: dict):
+    """Nearest stored listings to a car from the comparables index"""
+    try:
+        result = await asyncio.to_thread(
+            find_comparables, arguments.get("car_data"), arguments.get("item_id"), arguments.get("k", DEFAULT_K)
+        )
+        return [TextContent(
+            type="text",
+            text=json.dumps(result, ensure_ascii=False, default=str)
+        )]
+        
+    except Exception as e:
+        return [TextContent(
+            type="text",
+            text=json.dumps({"error": str(e)})
+        )]
+
+async def predict_depreciation_batch(arguments: dict):
+    """Predict depreciation for a whole result set, one row per car and one column per year"""
+    try:
+        cars = resolve_cars(arguments)
+        table = await asyncio.to_thread(depreciation_table, cars, arguments.get("years_ahead", 3))
+        return [TextContent(
+            type="text",
+            text=json.dumps(table, ensure_ascii=False, default=str)
+        )]
+        
+    except Exception as e:
+        return [TextContent(
+            type="text",
+            text=json.dumps({"error": str(e)})
+        )]
+
+async def refit_depreciation_model():
+    """Fit the depreciation curves now instead of waiting for the daily refit"""
+    try:
+        model = await asyncio.to_thread(fit_depreciation_model)
+        return [TextContent(
+            type="text",
+            text=json.dumps({"success": True, **model.to_dict()}, ensure_ascii=False)
+        )]
+        
+    except Exception as e:
+        return [TextContent(
+            type="text",
+            text=json.dumps({"error": str(e)})
+        )]
+
 async def predict_depreciation(car_data: dict, years_ahead: int = 3):
     """Predict car depreciation"""
     try:
@@ -172,13 +307,16 @@ async def predict_depreciation(car_data: dict, years_ahead: int = 3):
                 text=json.dumps({"error": "Invalid price data for depreciation calculation"})
             )]
             
-        # Simple depreciation model (can be enhanced with ML)
-        annual_depreciation_rate = 0.15  # 15% per year typical for cars
+        # Per-model curve fitted on the stored listings, 15% a year when there is none
+        model = await asyncio.to_thread(get_depreciation_model)
+        km_per_year = car_data.get('km_per_year')
+        if not isinstance(km_per_year, (int, float)):
+            km_per_year = None
+        factors, segments = model.value_factors([car_data.get('name')], [km_per_year], years_ahead)
         
         predictions = []
-        for year in range(1, years_ahead + 1):
+        for year, depreciation_factor in enumerate(factors[0].tolist(), start=1):
             future_age = current_age + year
-            depreciation_factor = (1 - annual_depreciation_rate) ** year
             predicted_value = current_price * depreciation_factor
             
             predictions.append({
@@ -193,7 +331,7 @@ async def predict_depreciation(car_data: dict, years_ahead: int = 3):
             "car_info": car_data,
             "current_price": current_price,
             "predictions": predictions,
-            "model_used": "Linear depreciation at 15% annually"
+            "model_used": model.describe_segment(segments[0])
         }
         
         return [TextContent(
@@ -207,44 +345,6 @@ async def predict_depreciation(car_data: dict, years_ahead: int = 3):
             text=json.dumps({"error": str(e)})
         )]
 
-def calculate_value_score(df):
-    """Calculate value score for cars"""
-    scores = []
-    for _, car in df.iterrows():
-        score = 0
-        
-        # Lower km/year is better
-        if car.get('km_per_year'):
-            if car['km_per_year'] < 15000:
-                score += 3
-            elif car['km_per_year'] < 20000:
-                score += 2
-            else:
-                score += 1
-                
-        # Newer cars get higher scores
-        if car.get('age'):
-            if car['age'] < 3:
-                score += 3
-            elif car['age'] < 5:
-                score += 2
-            else:
-                score += 1
-                
-        # Price efficiency (lower price per km is better)
-        if car.get('price') and car.get('mileage') and car['mileage'] > 0:
-            price_per_km = car['price'] / car['mileage']
-            if price_per_km < 2:
-                score += 3
-            elif price_per_km < 3:
-                score += 2
-            else:
-                score += 1
-                
-        scores.append(score)
-    
-    return scores
-
 if __name__ == "__main__":
     import sys
     from mcp.server.stdio import stdio_server
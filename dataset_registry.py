@@ -0,0 +1,85 @@
+import hashlib
+import os
+import threading
+
+from cachetools import LRUCache
+
+from car_records import CarRecordBatch
+from response_cache import CACHE_DIR
+
+# Datasets are shared between the scraper and analyzer processes through Arrow IPC files
+DATASET_DIR = os.path.join(CACHE_DIR, "datasets")
+MAX_DATASET_FILES = 50
+MEMORY_CACHE_SIZE = 8  # Decoded batches kept in each process
+
+_memory = LRUCache(maxsize=MEMORY_CACHE_SIZE)
+_lock = threading.Lock()
+
+
+def _dataset_path(dataset_id: str) -> str:
+    return os.path.join(DATASET_DIR, f"{dataset_id}.arrow")
+
+
+def register_dataset(cars) -> str:
+    """Store cars (a list of car dicts or a CarRecordBatch) and return its dataset id
+
+    The id is a hash of the stored data, so registering the same scrape twice
+    gives the same id.
+    """
+    import pyarrow as pa
+
+    batch = cars if isinstance(cars, CarRecordBatch) else CarRecordBatch.from_cars(cars)
+    table = batch.to_arrow()
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    payload = sink.getvalue().to_pybytes()
+    dataset_id = hashlib.sha1(payload).hexdigest()[:16]
+
+    with _lock:
+        _memory[dataset_id] = batch
+        path = _dataset_path(dataset_id)
+        if not os.path.exists(path):
+            os.makedirs(DATASET_DIR, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(payload)
+            os.replace(temp_path, path)
+            _prune_files()
+    return dataset_id
+
+
+def load_dataset(dataset_id: str) -> CarRecordBatch:
+    """Return the batch registered under dataset_id, from memory or from disk"""
+    import pyarrow as pa
+
+    with _lock:
+        batch = _memory.get(dataset_id)
+        if batch is not None:
+            return batch
+        path = _dataset_path(dataset_id)
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown dataset_id: {dataset_id}")
+        with pa.memory_map(path) as source:
+            batch = CarRecordBatch.from_arrow(pa.ipc.open_file(source).read_all())
+        _memory[dataset_id] = batch
+        return batch
+
+
+def resolve_cars(arguments: dict):
+    """The cars a tool call refers to: a registered dataset_id or inline cars_data"""
+    if arguments.get("dataset_id"):
+        return load_dataset(arguments["dataset_id"])
+    if arguments.get("cars_data") is not None:
+        return arguments["cars_data"]
+    raise ValueError("Either dataset_id or cars_data is required")
+
+
+def _prune_files():
+    # Drop the oldest dataset files beyond MAX_DATASET_FILES
+    files = sorted(
+        (os.path.join(DATASET_DIR, name) for name in os.listdir(DATASET_DIR) if name.endswith(".arrow")),
+        key=os.path.getmtime
+    )
+    for path in files[:-MAX_DATASET_FILES]:
+        os.remove(path)
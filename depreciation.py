@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from car_records import CarRecordBatch
+from mcp_servers.car_database import get_car_database, model_key
+from response_cache import CACHE_DIR
+
+MODEL_PATH = os.path.join(CACHE_DIR, "depreciation_model.json")
+MODEL_MAX_AGE = 24 * 60 * 60  # Refit from the stored listings once a day
+EMPTY_REFIT_INTERVAL = 60  # Seconds between refits while no curve could be fitted yet
+MIN_SEGMENT_LISTINGS = 30  # Fewer listings than this fall back to the all-cars curve
+FALLBACK_ANNUAL_RATE = 0.15  # 15% per year typical for cars, used when nothing can be fitted
+MIN_PRICE = 10000  # Lower asking prices are placeholders (leasing ads, "1 kr"), not market values
+DEFAULT_KM_PER_YEAR = 15000
+MILEAGE_UNIT = 10000  # Mileage coefficient is per 10 000 km
+ALL_CARS = "__all__"
+FIXED_RATE = "fixed_rate"
+FALLBACK_CURVE = {"age_coef": math.log(1 - FALLBACK_ANNUAL_RATE), "mileage_coef": 0.0}
+
+
+class DepreciationModel:
+    """Per-model depreciation curves: log(price) = intercept + age_coef * age + mileage_coef * mileage
+
+    A car's future value is its current price times
+    exp(age_coef * years + mileage_coef * years * km_per_year), so the curve
+    only supplies the rate and the car keeps its own price level.
+    """
+
+    def __init__(self, segments: dict = None, fitted_at: float = None, listings: int = 0):
+        self.segments = segments or {}
+        self.fitted_at = fitted_at
+        self.listings = listings
+
+    @classmethod
+    def fit(cls, observations: list, current_year: int = None):
+        """Fit one curve per model_key with enough listings, plus one over all cars"""
+        from sklearn.linear_model import LinearRegression
+
+        current_year = current_year or datetime.now().year
+        if observations:
+            keys = np.array([key or "" for key, _, _, _ in observations], dtype=object)
+            numbers = np.array([row[1:] for row in observations], dtype=float)
+        else:
+            keys = np.array([], dtype=object)
+            numbers = np.empty((0, 3))
+        age = np.clip(current_year - numbers[:, 0], 0, None)
+        features = np.column_stack([age, numbers[:, 1] / MILEAGE_UNIT])
+        valid = numbers[:, 2] >= MIN_PRICE
+        target = np.log(np.where(valid, numbers[:, 2], 1))
+
+        groups = {ALL_CARS: valid}
+        for key in set(keys[valid]) - {""}:
+            groups[key] = valid & (keys == key)
+
+        segments = {}
+        for key, rows in groups.items():
+            count = int(rows.sum())
+            if count < MIN_SEGMENT_LISTINGS:
+                continue
+            regression = LinearRegression().fit(features[rows], target[rows])
+            age_coef, mileage_coef = (float(value) for value in regression.coef_)
+            # A curve where value grows with age or mileage is noise, not depreciation
+            if age_coef >= 0 or mileage_coef > 0:
+                continue
+            segments[key] = {
+                "intercept": float(regression.intercept_),
+                "age_coef": age_coef,
+                "mileage_coef": mileage_coef,
+                "listings": count,
+                "r2": round(float(regression.score(features[rows], target[rows])), 4)
+            }
+        return cls(segments, time.time(), int(valid.sum()))
+
+    def segment_for(self, name: str):
+        """The curve key used for a listing title: its model, else all cars, else None (fixed rate)"""
+        key = model_key(name)
+        if key in self.segments:
+            return key
+        return ALL_CARS if ALL_CARS in self.segments else None
+
+    def describe_segment(self, key) -> str:
+        if key is None:
+            return f"Fixed depreciation at {FALLBACK_ANNUAL_RATE:.0%} annually"
+        segment = self.segments[key]
+        label = "all cars" if key == ALL_CARS else f"'{key}'"
+        return f"Fitted curve for {label} from {segment['listings']} listings"
+
+    def value_factors(self, names, km_per_year, years_ahead: int):
+        """Share of today's price each car keeps after 1..years_ahead years, shape (cars, years)
+
+        names are listing titles and km_per_year numbers (NaN or None for
+        unknown). Returns the factors and the curve key used for each car.
+        """
+        unique_names, inverse = np.unique(np.array([name or "" for name in names], dtype=object), return_inverse=True)
+        unique_keys = [self.segment_for(name) for name in unique_names]
+        curves = [self.segments[key] if key is not None else FALLBACK_CURVE for key in unique_keys]
+        age_coef = np.array([curve["age_coef"] for curve in curves], dtype=float)[inverse]
+        mileage_coef = np.array([curve["mileage_coef"] for curve in curves], dtype=float)[inverse]
+        km_per_year = np.array(km_per_year, dtype=float)
+        km_per_year = np.where(np.isnan(km_per_year), DEFAULT_KM_PER_YEAR, km_per_year)
+
+        # (cars, 1) rates against (1, years) horizons broadcast to the whole table at once
+        years = np.arange(1, years_ahead + 1, dtype=float)
+        rate = age_coef + mileage_coef * km_per_year / MILEAGE_UNIT
+        return np.exp(rate[:, None] * years[None, :]), [unique_keys[index] for index in inverse]
+
+    def to_dict(self) -> dict:
+        return {"fitted_at": self.fitted_at, "listings": self.listings, "segments": self.segments}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data.get("segments"), data.get("fitted_at"), data.get("listings", 0))
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def fit_depreciation_model(database=None) -> DepreciationModel:
+    """Refit the curves on every stored listing and save the parameters"""
+    global _model
+    database = database or get_car_database()
+    model = DepreciationModel.fit(database.price_observations())
+    os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
+    temp_path = f"{MODEL_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(model.to_dict(), f, ensure_ascii=False)
+    os.replace(temp_path, MODEL_PATH)
+    with _model_lock:
+        _model = model
+    return model
+
+
+def get_depreciation_model(max_age: float = MODEL_MAX_AGE) -> DepreciationModel:
+    """The fitted curves from memory or disk, refitted when older than max_age"""
+    global _model
+    with _model_lock:
+        model = _model
+        if model is None and os.path.exists(MODEL_PATH):
+            with open(MODEL_PATH, encoding="utf-8") as f:
+                model = _model = DepreciationModel.from_dict(json.load(f))
+    # An empty model is refitted more often, so the first stored listings are picked up soon
+    age = time.time() - (model.fitted_at or 0) if model is not None else None
+    if age is None or age > max_age or (not model.segments and age >= EMPTY_REFIT_INTERVAL):
+        model = fit_depreciation_model()
+    return model
+
+
+def depreciation_table(cars, years_ahead: int = 3, model: DepreciationModel = None) -> dict:
+    """Predicted values of many cars (a list of car dicts or a CarRecordBatch) as one compact table
+
+    Rows hold id, name, link, current price, curve and one predicted value per
+    year; sold cars and cars without a price are counted in skipped.
+    """
+    model = model or get_depreciation_model()
+    if isinstance(cars, CarRecordBatch):
+        names = cars.names()
+        prices = cars.numeric('price')
+        km_per_year = cars.numeric('km_per_year')
+        ids = cars.ids.tolist()
+        links = cars.strings['link'].tolist()
+    else:
+        def number(value):
+            return value if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+        names = [car.get('name') for car in cars]
+        prices = np.array([number(car.get('price')) for car in cars], dtype=float)
+        km_per_year = [number(car.get('km_per_year')) for car in cars]
+        ids = [car.get('id') for car in cars]
+        links = [car.get('link') for car in cars]
+
+    priced = np.flatnonzero(~np.isnan(prices))
+    factors, keys = model.value_factors(
+        [names[index] for index in priced], np.asarray(km_per_year, dtype=float)[priced], years_ahead
+    )
+    values = np.rint(prices[priced, None] * factors).astype(np.int64)
+
+    curves = {}
+    rows = []
+    for row, (index, key) in enumerate(zip(priced.tolist(), keys)):
+        curve = key or FIXED_RATE
+        if curve not in curves:
+            curves[curve] = model.describe_segment(key)
+        rows.append([ids[index], names[index], links[index], int(prices[index]), curve, *values[row].tolist()])
+
+    return {
+        "years": list(range(1, years_ahead + 1)),
+        "columns": ["id", "name", "link", "current_price", "curve", *(f"year_{year}" for year in range(1, years_ahead + 1))],
+        "rows": rows,
+        "curves": curves,
+        "skipped": len(prices) - len(priced)
+    }
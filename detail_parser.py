@@ -0,0 +1,283 @@
+import re
+
+from lxml import etree, html
+
+from listing_parser import _text, _TEXT_XPATH
+from specifications import normalize_specifications
+from vocabulary import get_equipment_vocabulary, get_keyword_matcher, get_specification_vocabularies
+
+# Section kinds by words in the section heading, checked in this order
+SECTION_HEADINGS = (
+    ("description", ("beskrivelse", "description")),
+    ("specifications", ("spesifikasjoner", "specifications")),
+    ("equipment", ("utstyr", "equipment")),
+)
+HEADING_TAGS = frozenset(("h1", "h2", "h3", "h4", "h5", "h6"))
+_NESTED_COUNT_XPATH = etree.XPath("count(.//div | .//span | .//p)")
+# Text between sentence ends and line breaks, the unit extract_equipment_alternative reports
+SEGMENT_RE = re.compile(r"[^.\n]+")
+
+
+def new_car_details(car_url):
+    return {
+        "url": car_url,
+        "title": None,
+        "description": None,
+        "specifications": {},
+        "equipment": [],
+        "equipment_codes": [],  # Canonical codes from car_vocabulary.json, e.g. "tow_hitch"
+        "normalized_specs": {},  # specifications mapped to specifications.SPEC_FIELDS
+        "heftelser_info": {}  # Erstatter seller_info
+    }
+
+
+def section_kind(heading_text):
+    """'description', 'specifications' or 'equipment' for a section heading, None for other sections"""
+    heading_text = heading_text.lower()
+    for kind, words in SECTION_HEADINGS:
+        if any(word in heading_text for word in words):
+            return kind
+    return None
+
+
+class SectionContent:
+    """Everything the detail extractors use from one section, gathered in a single walk"""
+
+    def __init__(self, heading):
+        self.heading = heading
+        self.paragraphs = []
+        self.pairs = []  # (key, value) from dt/dd and table rows
+        self.list_items = []
+        self.leaf_divs = []  # Text of divs without child elements, for specifications and equipment
+
+
+def walk_section(section):
+    """Classify a section by its first heading and collect its content in one walk
+
+    Returns (kind, SectionContent), or (None, None) as soon as the heading shows
+    the section is not one we extract from. Nested sections are skipped; they
+    are walked on their own.
+    """
+    kind = None
+    content = SectionContent(None)
+    pending_key = None
+    stack = list(reversed(section))
+    while stack:
+        element = stack.pop()
+        tag = element.tag
+        if not isinstance(tag, str) or tag == 'section':
+            continue  # Comments, processing instructions and nested sections
+        if tag in HEADING_TAGS and content.heading is None:
+            content.heading = _text(element)
+            kind = section_kind(content.heading)
+            if kind is None:
+                return None, None
+        elif tag == 'p':
+            content.paragraphs.append(_text(element))
+        elif tag == 'dt':
+            pending_key = _text(element)
+        elif tag == 'dd':
+            if pending_key is not None:
+                content.pairs.append((pending_key, _text(element)))
+                pending_key = None
+        elif tag == 'tr':
+            cells = [cell for cell in element if cell.tag in ('td', 'th')]
+            if len(cells) >= 2:
+                content.pairs.append((_text(cells[0]), _text(cells[1])))
+        elif tag == 'li':
+            content.list_items.append(_text(element))
+        elif tag == 'div' and not len(element):
+            content.leaf_divs.append(_text(element))
+        else:
+            stack.extend(reversed(element))
+    return kind, content
+
+
+def extract_description_from_section(section, content):
+    """Extract description text from a beskrivelse section"""
+    description = None
+
+    # Method 1: Combine the paragraphs, skipping the header
+    desc_parts = [text for text in content.paragraphs if text and text.lower() != 'beskrivelse']
+    if desc_parts:
+        description = ' '.join(desc_parts)
+
+    # Method 2: First longer div of mostly plain text. Only reached without paragraphs,
+    # so the subtree is walked again here instead of on every section
+    if not description:
+        for div in section.iter('div'):
+            text = _text(div)
+            if text and len(text) > 20 and text.lower() != 'beskrivelse':
+                # Allow some nesting but not too much, e.g. a <span> or two <br> wrappers
+                if _NESTED_COUNT_XPATH(div) <= 2:
+                    description = text
+                    break
+
+    # Method 3: Get all text from section excluding header
+    if not description:
+        all_text = _text(section)
+        if content.heading and all_text.startswith(content.heading):
+            description = all_text[len(content.heading):].strip()
+        elif len(all_text) > 20:
+            description = all_text
+
+    return description if description and len(description) > 10 else None
+
+
+def extract_specifications_from_section(content):
+    """Extract specifications from the dt/dd pairs and table rows of a section"""
+    specs = {key: value for key, value in content.pairs if key and value}
+
+    # Sections without a list or table: a div with a known specification label holds the
+    # label and the next div its value. Fixed pairs of divs go out of step at the first stray div.
+    if not specs:
+        labels, _ = get_specification_vocabularies()
+        divs = content.leaf_divs
+        i = 0
+        while i < len(divs) - 1:
+            if labels.lookup(divs[i]) is not None and divs[i + 1]:
+                specs[divs[i]] = divs[i + 1]
+                i += 2
+            else:
+                i += 1
+
+    # No known labels at all: pair up consecutive plain divs
+    if not specs:
+        divs = content.leaf_divs
+        for i in range(0, len(divs) - 1, 2):
+            potential_key, potential_value = divs[i], divs[i + 1]
+            # Check if this looks like a key-value pair
+            if (len(potential_key) < 50 and len(potential_value) < 200 and
+                    ':' not in potential_key and potential_key and potential_value):
+                specs[potential_key] = potential_value
+
+    return specs
+
+
+def extract_equipment_from_section(content):
+    """Extract equipment list from the list items and plain divs of a section
+
+    Only divs without child elements are read: a wrapper div around several
+    items would give their texts run together, e.g. "KlimaanleggCruisekontroll".
+    """
+    equipment = {}  # Ordered set
+
+    for text in content.list_items:
+        if text and len(text) < 100:  # Avoid very long text that's not equipment
+            equipment[text] = None
+
+    for text in content.leaf_divs:
+        # Check if this looks like an equipment item (short, descriptive text)
+        if (text and len(text.split()) <= 5 and len(text) < 50 and
+                not any(char.isdigit() for char in text[:10])):  # Avoid specs that start with numbers
+            equipment[text] = None
+
+    return list(equipment)
+
+
+def page_text(root):
+    """Equivalent of BeautifulSoup's get_text() for the whole page"""
+    return ''.join(_TEXT_XPATH(root))
+
+
+def registration_number_from(specs):
+    for key, value in specs.items():
+        if 'registreringsnummer' in key.lower() or 'regnr' in key.lower():
+            return value
+    return None
+
+
+def parse_car_details(page_html, car_url):
+    """Parse a car listing page, returning the details and the registration number if found"""
+    root = html.document_fromstring(page_html)
+    details = new_car_details(car_url)
+
+    # Extract title
+    title_tag = root.find('.//h1')
+    if title_tag is not None:
+        details["title"] = _text(title_tag)
+
+    # Extract registration number from specifications for heftelser lookup
+    registration_number = None
+
+    # Find the main content area
+    main_content = root.find('.//main')
+    if main_content is not None:
+        for section in main_content.iter('section'):
+            kind, content = walk_section(section)
+
+            if kind == "description":
+                description = extract_description_from_section(section, content)
+                if description:
+                    details["description"] = description
+
+            elif kind == "specifications":
+                specs = extract_specifications_from_section(content)
+                details["specifications"].update(specs)
+                registration_number = registration_number_from(specs) or registration_number
+
+            elif kind == "equipment":
+                equipment = extract_equipment_from_section(content)
+                details["equipment"].extend(equipment)
+
+    # Alternative approach for specs and equipment if not found, over the page text extracted once
+    text = None
+    if not details["specifications"]:
+        text = page_text(root)
+        specs = extract_specifications_alternative(text)
+        details["specifications"].update(specs)
+        registration_number = registration_number_from(specs) or registration_number
+
+    if not details["equipment"]:
+        text = text if text is not None else page_text(root)
+        equipment = extract_equipment_alternative(text)
+        details["equipment"].extend(equipment)
+
+    details["equipment_codes"] = get_equipment_vocabulary().canonicalize(details["equipment"])
+    details["normalized_specs"] = normalize_specifications(details["specifications"])
+    return details, registration_number
+
+
+_spec_value_pattern = None
+
+
+def extract_specifications_alternative(text):
+    """Alternative method to extract specifications if section-based approach fails
+
+    Every specification keyword is found in one scan: a lookahead alternation
+    matches at each keyword without consuming text, so a keyword inside
+    another keyword's value is still found. The first value per keyword wins.
+    """
+    global _spec_value_pattern
+    matcher = get_keyword_matcher("specification_keywords")
+    if _spec_value_pattern is None:
+        _spec_value_pattern = re.compile(rf"(?=({matcher.alternation})[:\s]*([^\n\r,]+))", re.IGNORECASE)
+
+    found = {}
+    for match in _spec_value_pattern.finditer(text):
+        keyword = matcher.keyword(match.group(1))
+        if keyword not in found:
+            found[keyword] = match.group(2).strip()
+            if len(found) == len(matcher.keywords):
+                break
+
+    # Vocabulary order, as the specifications are shown
+    return {keyword.capitalize(): found[keyword] for keyword in matcher.keywords.values() if keyword in found}
+
+
+def extract_equipment_alternative(text):
+    """Alternative method to extract equipment if section-based approach fails
+
+    Reports each sentence fragment that mentions an equipment keyword,
+    checking all keywords in one search per fragment.
+    """
+    keyword_pattern = get_keyword_matcher("equipment_keywords").pattern
+    equipment = {}  # Ordered set
+
+    for segment in SEGMENT_RE.findall(text.lower()):
+        if keyword_pattern.search(segment):
+            clean_match = segment.strip()
+            if 10 < len(clean_match) < 50:  # Reasonable length for equipment item
+                equipment[clean_match.capitalize()] = None
+
+    return list(equipment)
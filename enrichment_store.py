@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from response_cache import CACHE_DIR
+
+# How long a lookup result is used before the source is asked again, per source (seconds)
+SOURCE_MAX_AGE = {
+    "heftelser": 24 * 60 * 60,
+    "eu_kontroll": 7 * 24 * 60 * 60,
+}
+# "Not found" is kept for a shorter time at most: a new car may get registered in the meantime
+NOT_FOUND_MAX_AGE = {
+    "heftelser": 24 * 60 * 60,
+    "eu_kontroll": 24 * 60 * 60,
+}
+DEFAULT_MAX_AGE = 24 * 60 * 60
+SQLITE_MAX_PARAMS = 500  # Registration numbers per IN (...) query
+
+
+def normalize_registration_number(registration_number: str) -> str:
+    """'ek 12345' -> 'EK12345', so the same car is stored once whatever the spelling"""
+    return "".join((registration_number or "").split()).upper()
+
+
+class EnrichmentStore:
+    """Heftelser and EU-kontroll lookups stored by registration number
+
+    Each source has its own freshness limit, and "not found" answers are
+    stored too, so a fleet that has been enriched before needs no network
+    calls until its results expire. Errors are never stored.
+    """
+
+    def __init__(self, path: str = None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "enrichment.sqlite")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS enrichment (
+                source TEXT,
+                registration_number TEXT,
+                found INTEGER,
+                data TEXT,
+                fetched_at REAL,
+                PRIMARY KEY (source, registration_number)
+            )
+        """)
+        self._conn.commit()
+        self.stats = {"hits": 0, "not_found_hits": 0, "misses": 0, "stale": 0, "stores": 0}
+
+    def get_many(self, source: str, registration_numbers: list) -> dict:
+        """Fresh results as {registration_number: data}; expired and unknown numbers are left out
+
+        Keys are the registration numbers as given.
+        """
+        wanted = {}
+        for registration_number in registration_numbers:
+            wanted.setdefault(normalize_registration_number(registration_number), []).append(registration_number)
+        wanted.pop("", None)
+        keys = list(wanted)
+
+        now = time.time()
+        max_age = SOURCE_MAX_AGE.get(source, DEFAULT_MAX_AGE)
+        not_found_max_age = NOT_FOUND_MAX_AGE.get(source, max_age)
+        results = {}
+        with self._lock:
+            rows = []
+            for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+                chunk = keys[start:start + SQLITE_MAX_PARAMS]
+                rows.extend(self._conn.execute(
+                    "SELECT registration_number, found, data, fetched_at FROM enrichment "
+                    f"WHERE source = ? AND registration_number IN ({', '.join('?' * len(chunk))})",
+                    [source, *chunk]
+                ).fetchall())
+            for key, found, data, fetched_at in rows:
+                if now - fetched_at >= (max_age if found else not_found_max_age):
+                    self.stats["stale"] += 1
+                    continue
+                self.stats["hits" if found else "not_found_hits"] += 1
+                for registration_number in wanted[key]:
+                    results[registration_number] = json.loads(data)
+            self.stats["misses"] += len(keys) - len(rows)
+        return results
+
+    def get(self, source: str, registration_number: str):
+        """A fresh result for one registration number, None when it has to be looked up"""
+        return self.get_many(source, [registration_number]).get(registration_number)
+
+    def put_many(self, source: str, results: dict, found: dict = None):
+        """Store {registration_number: data}; found maps numbers the source did not know to False"""
+        now = time.time()
+        rows = [
+            (source, normalize_registration_number(registration_number),
+             int((found or {}).get(registration_number, True)), json.dumps(data, ensure_ascii=False), now)
+            for registration_number, data in results.items()
+            if normalize_registration_number(registration_number)
+        ]
+        with self._lock:
+            self.stats["stores"] += len(rows)
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO enrichment VALUES (?, ?, ?, ?, ?)", rows)
+
+    def put(self, source: str, registration_number: str, data: dict, found: bool = True):
+        self.put_many(source, {registration_number: data}, {registration_number: found})
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT source, COUNT(*) FROM enrichment GROUP BY source"
+            ).fetchall())
+        return {**self.stats, "entries": counts}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM enrichment")
+            self._conn.commit()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_enrichment_store() -> EnrichmentStore:
+    """Return the process-wide enrichment store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EnrichmentStore()
+        return _store
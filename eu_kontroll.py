@@ -1,7 +1,38 @@
-import requests
 from lxml import html
+from response_cache import cached_get
+from enrichment_store import get_enrichment_store, normalize_registration_number
 
 def scrape_eu_kontroll(registration_number: str):
+    """
+    EU-kontroll information for a given registration number, from the enrichment store or vegvesen.no
+    """
+    return scrape_eu_kontroll_many([registration_number])[registration_number]
+
+def scrape_eu_kontroll_many(registration_numbers: list):
+    """
+    EU-kontroll information for many registration numbers, only scraping those without a fresh stored result
+    """
+    store = get_enrichment_store()
+    results = store.get_many("eu_kontroll", registration_numbers)
+    lookups = {}  # Normalized number -> result, so "EK 12345" and "ek12345" are fetched once
+    fetched = {}
+    found = {}
+    for registration_number in registration_numbers:
+        if registration_number in results:
+            continue
+        key = normalize_registration_number(registration_number)
+        if key not in lookups:
+            eu_kontroll_info = lookups[key] = fetch_eu_kontroll(registration_number)
+            # Errors are not stored, the next call tries again
+            if not eu_kontroll_info.get("error"):
+                fetched[registration_number] = eu_kontroll_info
+                # Vegvesen har ingen kontrolldata for ukjente registreringsnummer
+                found[registration_number] = any(value is not None for value in eu_kontroll_info.values())
+        results[registration_number] = lookups[key]
+    store.put_many("eu_kontroll", fetched, found)
+    return results
+
+def fetch_eu_kontroll(registration_number: str):
     """
     Scrape EU-kontroll information for a given registration number from vegvesen.no
     """
@@ -12,7 +43,9 @@ def scrape_eu_kontroll(registration_number: str):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         
-        response = requests.get(url, headers=headers, timeout=10)
+        response = cached_get(url, "eu_kontroll", headers=headers, timeout=10)
+        # Feilsider (429, 5xx, vedlikehold) må ikke lagres som "ikke funnet"
+        response.raise_for_status()
         tree = html.fromstring(response.content)
         
         eu_kontroll_info = {
@@ -26,20 +59,21 @@ def scrape_eu_kontroll(registration_number: str):
         sist_elements = tree.xpath("/html/body/main/div[1]/div/div/div[4]/div/div/div[1]/div[3]/div[1]/div/dl[1]/dd")
         print(f"Found {len(sist_elements)} elements for 'sist godkjent'")
         if sist_elements:
-            sist_godkjent_tekst = sist_elements[0].text_content().strip()
+            eu_kontroll_info["sist_godkjent"] = sist_elements[0].text_content().strip() or None
 
         # For frist neste kontroll  
         frist_elements = tree.xpath("/html/body/main/div[1]/div/div/div[4]/div/div/div[1]/div[3]/div[1]/div/dl[2]/dd")
         print(f"Found {len(frist_elements)} elements for 'frist neste kontroll'")
         if frist_elements:
-            frist_tekst = frist_elements[0].text_content().strip()
+            eu_kontroll_info["frist_neste_kontroll"] = frist_elements[0].text_content().strip() or None
                 
         return eu_kontroll_info
         
-    except:
+    except Exception as e:
         return {
             "sist_godkjent": None,
-            "frist_neste_kontroll": None
+            "frist_neste_kontroll": None,
+            "error": str(e)
         }
 
 # Test
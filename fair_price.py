@@ -0,0 +1,170 @@
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from mcp_servers.car_database import get_car_database, model_key
+from response_cache import CACHE_DIR
+
+MODEL_PATH = os.path.join(CACHE_DIR, "fair_price_model.npz")
+HASH_BUCKETS = 512  # Model and trim tokens are hashed into this many weights
+BASE_FEATURES = 3  # Intercept, age and mileage come before the hashed tokens
+RIDGE_ALPHA = 1.0
+MIN_OBSERVATIONS = 50  # Fewer stored listings than this give no fair price
+MIN_PRICE = 10000  # Lower asking prices are placeholders (leasing ads, "1 kr"), not market values
+MILEAGE_UNIT = 10000
+OUTLIER_Z = 2.5  # Residuals beyond this many standard deviations flag a price outlier
+REFRESH_INTERVAL = 60  # Seconds between checks for newly stored listings
+
+TOKEN_RE = re.compile(r"[a-z0-9æøå][a-z0-9æøå.\-]*")
+
+
+def price_tokens(name, additional_info):
+    """Make/model and trim tokens of a listing, e.g. 'model:toyota rav4', 'trim:hybrid', 'trim:awd'"""
+    tokens = []
+    key = model_key(name)
+    if key:
+        tokens.append(f"make:{key.split()[0]}")
+        tokens.append(f"model:{key}")
+    tokens.extend(f"trim:{token}" for token in TOKEN_RE.findall((additional_info or "").lower()))
+    return tokens
+
+
+def _hashed(tokens):
+    """(bucket, sign) pairs; crc32 keeps the buckets the same across processes"""
+    pairs = []
+    for token in tokens:
+        digest = zlib.crc32(token.encode("utf-8"))
+        pairs.append((BASE_FEATURES + digest % HASH_BUCKETS, 1.0 if digest & 0x80000000 else -1.0))
+    return pairs
+
+
+class FairPriceModel:
+    """Ridge regression of log(price) on age, mileage and hashed model/trim tokens
+
+    The model only keeps the normal-equation sums X'X, X'y and y'y, so new
+    listings are added in O(tokens^2) each and the weights are re-solved
+    from a fixed-size system, never from the stored listings.
+    """
+
+    def __init__(self, xtx=None, xty=None, yty: float = 0.0, count: int = 0, seen_until: float = 0.0):
+        size = BASE_FEATURES + HASH_BUCKETS
+        self.xtx = np.zeros((size, size)) if xtx is None else xtx
+        self.xty = np.zeros(size) if xty is None else xty
+        self.yty = yty
+        self.count = count
+        self.seen_until = seen_until  # first_seen of the newest listing added
+        self.coef = None
+        self.residual_std = None
+        self._token_weights = {}
+
+    def partial_fit(self, observations: list, current_year: int = None):
+        """Add (first_seen, name, additional_info, year, mileage, price) rows to the sums"""
+        current_year = current_year or datetime.now().year
+        for first_seen, name, additional_info, year, mileage, price in observations:
+            self.seen_until = max(self.seen_until, first_seen or 0)
+            if not price or price < MIN_PRICE:
+                continue
+            indices = [0, 1, 2]
+            values = [1.0, max(current_year - year, 0), mileage / MILEAGE_UNIT]
+            for bucket, sign in _hashed(price_tokens(name, additional_info)):
+                indices.append(bucket)
+                values.append(sign)
+            indices = np.array(indices)
+            values = np.array(values)
+            target = np.log(price)
+            np.add.at(self.xtx, (indices[:, None], indices[None, :]), values[:, None] * values[None, :])
+            np.add.at(self.xty, indices, values * target)
+            self.yty += target * target
+            self.count += 1
+        self.coef = None
+
+    def solve(self):
+        """Ridge weights from the sums; the intercept is not penalised"""
+        if self.count < MIN_OBSERVATIONS:
+            self.coef = None
+            return None
+        penalty = np.full(len(self.xty), RIDGE_ALPHA)
+        penalty[0] = 0.0
+        self.coef = np.linalg.solve(self.xtx + np.diag(penalty), self.xty)
+        # Residual sum of squares straight from the sums: y'y - 2b'X'y + b'X'Xb
+        rss = self.yty - 2 * self.coef @ self.xty + self.coef @ self.xtx @ self.coef
+        self.residual_std = float(np.sqrt(max(rss, 0.0) / max(self.count - BASE_FEATURES, 1)))
+        self._token_weights = {}
+        return self.coef
+
+    def _token_weight(self, name, additional_info):
+        key = (name, additional_info)
+        weight = self._token_weights.get(key)
+        if weight is None:
+            weight = sum(sign * self.coef[bucket] for bucket, sign in _hashed(price_tokens(name, additional_info)))
+            self._token_weights[key] = weight
+        return weight
+
+    def fair_prices(self, names, additional_infos, ages, mileages):
+        """Expected market price per car, NaN where age or mileage is unknown or nothing is fitted"""
+        ages = np.asarray(ages, dtype=float)
+        if self.coef is None and self.solve() is None:
+            return np.full(len(ages), np.nan)
+        token_weights = np.array(
+            [self._token_weight(name, info) for name, info in zip(names, additional_infos)], dtype=float
+        )
+        log_price = (self.coef[0] + self.coef[1] * np.clip(ages, 0, None)
+                     + self.coef[2] * np.asarray(mileages, dtype=float) / MILEAGE_UNIT + token_weights)
+        return np.exp(log_price)
+
+    def price_signals(self, df):
+        """fair_price, discount_vs_market and price_outlier columns for a DataFrame of available cars
+
+        discount_vs_market is the share below the fair price (0.1 = 10% cheaper
+        than comparable cars); price_outlier marks prices whose log residual
+        lies more than OUTLIER_Z standard deviations from the fit.
+        """
+        def column(name):
+            return df[name].to_numpy() if name in df.columns else np.full(len(df), None)
+
+        fair_price = self.fair_prices(column('name'), column('additional_info'),
+                                      column('age').astype(float), column('mileage').astype(float))
+        price = np.asarray(column('price'), dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            discount = 1 - price / fair_price
+            residual = np.log(price) - np.log(fair_price)
+        outlier = np.abs(residual) > OUTLIER_Z * self.residual_std if self.residual_std else np.zeros(len(df), dtype=bool)
+        return fair_price, discount, outlier
+
+    def save(self, path: str = MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, xtx=self.xtx, xty=self.xty, yty=self.yty, count=self.count, seen_until=self.seen_until)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH):
+        with np.load(path) as data:
+            if data["xty"].shape != (BASE_FEATURES + HASH_BUCKETS,):
+                return cls()  # Saved with another HASH_BUCKETS, start over
+            return cls(data["xtx"], data["xty"], float(data["yty"]), int(data["count"]), float(data["seen_until"]))
+
+
+_model = None
+_model_lock = threading.Lock()
+_last_refresh = 0.0
+
+
+def get_fair_price_model(database=None) -> FairPriceModel:
+    """The fair-price model, topped up with listings stored since it was last updated"""
+    global _model, _last_refresh
+    with _model_lock:
+        if _model is None:
+            _model = FairPriceModel.load() if os.path.exists(MODEL_PATH) else FairPriceModel()
+        if time.time() - _last_refresh >= REFRESH_INTERVAL:
+            _last_refresh = time.time()
+            new_rows = (database or get_car_database()).listings_since(_model.seen_until)
+            if new_rows:
+                _model.partial_fit(new_rows)
+                _model.save()
+        return _model
@@ -0,0 +1,125 @@
+import asyncio
+import math
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+from http_fetcher import get_fetcher
+from listing_parser import parse_listings, extract_total_results, DEFAULT_BACKEND
+
+FINN_MAX_PAGES = 50  # Finn.no does not serve result pages beyond this
+AUTO_PAGE_WINDOW = 4  # Pages requested ahead when the total result count is unknown
+
+
+def build_page_url(url: str, page: int) -> str:
+    """URL of a given (1-based) result page of a Finn.no search"""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != 'page']
+    if page > 1:
+        query.append(('page', str(page)))
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
+
+
+def dedupe_cars(cars: list, seen: set) -> list:
+    """Drop listings already seen earlier in the crawl (ads shift between pages while we page)"""
+    fresh = []
+    for car in cars:
+        key = car.get('link') or (car.get('name'), car.get('year'), car.get('mileage'), car.get('price'))
+        if key not in seen:
+            seen.add(key)
+            fresh.append(car)
+    return fresh
+
+
+async def fetch_search_page_html(url: str, page: int, parser: str = DEFAULT_BACKEND):
+    """Fetch and parse one result page, returning (page, cars, page_html)"""
+    page_html = await get_fetcher().get_text(build_page_url(url, page), source="finn_search")
+    # Parse off the event loop so other tool calls keep being served
+    cars = await asyncio.to_thread(parse_listings, page_html, parser)
+    return page, cars, page_html
+
+
+async def fetch_search_page(url: str, page: int, parser: str = DEFAULT_BACKEND):
+    """Fetch and parse one result page, returning (page, cars)"""
+    page, cars, _ = await fetch_search_page_html(url, page, parser)
+    return page, cars
+
+
+async def iter_search_pages(url: str, max_pages: int = 1, parser: str = DEFAULT_BACKEND):
+    """Yield (page, cars) for each result page as soon as it has been parsed
+
+    All pages are requested concurrently; only the cars of pages not yet
+    consumed are held in memory, never the raw HTML of finished pages.
+    """
+    seen = set()
+    tasks = [asyncio.create_task(fetch_search_page(url, page, parser)) for page in range(1, max_pages + 1)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            page, cars = await next_done
+            yield page, dedupe_cars(cars, seen)
+    finally:
+        # Stop outstanding requests if the consumer bails out early or a page fails
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_all_search_pages(url: str, parser: str = DEFAULT_BACKEND, max_pages: int = FINN_MAX_PAGES,
+                                crawl: dict = None):
+    """Yield (page, cars) for every result page of a search until it is exhausted
+
+    The total result count on the first page is only a hint: the pages it
+    implies, plus one to confirm the end, are fetched concurrently. Paging
+    then goes on a window at a time until a page without listings or
+    max_pages. Page sizes vary with promoted ads, so a short page does not
+    mark the end. A count that is too low costs extra requests, not pages.
+
+    Pass a dict as crawl to learn how the crawl ended: crawl["exhausted"] is
+    True only when an empty page after the listings was seen, i.e. every page
+    of the search was fetched.
+    """
+    if crawl is None:
+        crawl = {}
+    crawl["exhausted"] = False
+    seen = set()
+    page, cars, page_html = await fetch_search_page_html(url, 1, parser)
+    if not cars:
+        return  # A block or error page looks the same as a search without results
+    yield page, dedupe_cars(cars, seen)
+
+    total_results = extract_total_results(page_html)
+    if total_results is not None:
+        horizon = min(max_pages, math.ceil(total_results / len(cars)) + 1)
+    else:
+        horizon = min(max_pages, 1 + AUTO_PAGE_WINDOW)
+
+    pending = {}
+    next_page = 2
+    exhausted_at = None
+    try:
+        while True:
+            if not pending and exhausted_at is None and next_page > horizon:
+                # Every page up to the horizon had listings: look further
+                horizon = min(max_pages, horizon + AUTO_PAGE_WINDOW)
+            while next_page <= horizon and exhausted_at is None:
+                task = asyncio.create_task(fetch_search_page(url, next_page, parser))
+                pending[task] = next_page
+                next_page += 1
+            if not pending:
+                break
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=pending.get):
+                page = pending.pop(task, None)
+                if page is None or (exhausted_at is not None and page > exhausted_at):
+                    continue
+                page, cars = task.result()
+                if not cars:
+                    # Past the last page: drop everything scheduled after it
+                    exhausted_at = page
+                    for other in [other for other, other_page in pending.items() if other_page > page]:
+                        other.cancel()
+                        del pending[other]
+                    continue
+                yield page, dedupe_cars(cars, seen)
+        crawl["exhausted"] = exhausted_at is not None
+    finally:
+        for task in pending:
+            task.cancel()
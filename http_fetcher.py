@@ -0,0 +1,118 @@
+import asyncio
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+from response_cache import get_response_cache
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Global and per-host limits - keep these polite, Finn.no and brreg are shared services
+MAX_CONCURRENCY = 10
+PER_HOST_CONCURRENCY = 4
+PER_HOST_DELAY = 0.1  # Minimum seconds between two requests starting against the same host
+DEFAULT_TIMEOUT = 10
+
+
+class AsyncFetcher:
+    """Async HTTP fetcher with a shared connection pool and politeness limits"""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY,
+                 per_host_concurrency: int = PER_HOST_CONCURRENCY,
+                 per_host_delay: float = PER_HOST_DELAY,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency
+            )
+        )
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay = per_host_delay
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._host_semaphores = {}
+        self._host_locks = {}
+        self._host_next_start = {}
+
+    async def _wait_for_host_slot(self, host: str):
+        """Space out request starts against the same host"""
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            now = time.monotonic()
+            next_start = self._host_next_start.get(host, now)
+            if next_start > now:
+                await asyncio.sleep(next_start - now)
+                now = next_start
+            self._host_next_start[host] = now + self.per_host_delay
+
+    async def get(self, url: str, headers: dict = None, source: str = None):
+        """GET a URL within the global and per-host limits, raising on HTTP errors
+
+        With a source (e.g. "finn_search") the response goes through the shared
+        on-disk response cache, using that source's TTL.
+        """
+        if source is None:
+            return await self._get(url, headers)
+
+        # Cache reads and writes hit SQLite on disk, so they run off the event loop
+        cache = get_response_cache()
+        entry, is_fresh = await asyncio.to_thread(cache.lookup, url, source)
+        if is_fresh:
+            return entry
+
+        request_headers = dict(headers or {})
+        request_headers.update(cache.conditional_headers(entry))
+        response = await self._get(url, request_headers, allow_not_modified=entry is not None)
+        if response.status_code == 304:
+            return await asyncio.to_thread(cache.mark_revalidated, entry)
+
+        await asyncio.to_thread(
+            cache.store, url, source, response.status_code, response.content, response.encoding,
+            response.headers.get('ETag'), response.headers.get('Last-Modified')
+        )
+        return response
+
+    async def _get(self, url: str, headers: dict = None, allow_not_modified: bool = False) -> httpx.Response:
+        host = urlsplit(url).netloc
+        host_semaphore = self._host_semaphores.setdefault(
+            host, asyncio.Semaphore(self.per_host_concurrency)
+        )
+        async with self._semaphore, host_semaphore:
+            await self._wait_for_host_slot(host)
+            response = await self.client.get(url, headers=headers)
+        if not (allow_not_modified and response.status_code == 304):
+            response.raise_for_status()
+        return response
+
+    async def get_text(self, url: str, headers: dict = None, source: str = None) -> str:
+        response = await self.get(url, headers=headers, source=source)
+        return response.text
+
+    async def get_many(self, urls: list, headers: dict = None, source: str = None) -> list:
+        """Fetch all URLs concurrently, returning the page texts in input order"""
+        return await asyncio.gather(*(self.get_text(url, headers=headers, source=source) for url in urls))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# One fetcher per event loop: httpx pools and asyncio primitives are bound to the loop
+# they were created on, and Streamlit creates a fresh loop for every button click.
+_fetchers = weakref.WeakKeyDictionary()
+
+
+def get_fetcher() -> AsyncFetcher:
+    """Return the shared fetcher for the running event loop"""
+    loop = asyncio.get_running_loop()
+    fetcher = _fetchers.get(loop)
+    if fetcher is None:
+        fetcher = AsyncFetcher()
+        _fetchers[loop] = fetcher
+    return fetcher
@@ -0,0 +1,407 @@
+import json
+import re
+import time
+from datetime import date
+
+from bs4 import BeautifulSoup
+from lxml import etree, html
+
+from car_records import CarRecordBatch
+
+BASE_URL = "https://www.finn.no"
+
+PAGE_CONTAINER_RE = re.compile(r"page-container")
+YEAR_RE = re.compile(r'\b(19\d{2}|20\d{2})\b')
+MILEAGE_RE = re.compile(r'(\d[\d\s.,]*\s*km)\b', re.IGNORECASE)
+NON_DIGIT_RE = re.compile(r'[^\d]')
+# Finn item id in an ad link: /mobility/item/123456789 or ...ad.html?finnkode=123456789
+FINN_ITEM_ID_RE = re.compile(r'(?:/item/|[?&]finnkode=)(\d+)')
+# "1 234 treff" in the search header, possibly split by tags and non-breaking spaces
+TOTAL_RESULTS_RE = re.compile(
+    r'(\d{1,3}(?:(?:\s|\u00a0|&nbsp;|&#160;)?\d{3})*)\s*(?:<[^>]+>\s*)*(?:treff|annonser)\b',
+    re.IGNORECASE
+)
+
+# CSS selectors used by the BeautifulSoup backend
+ADS_CONTAINER_SELECTOR = 'div:nth-of-type(1) > div:nth-of-type(2) > section > div:nth-of-type(3)'
+IMAGE_SELECTOR = 'div:nth-of-type(2) > div > img'
+INFO_DIV_SELECTOR = 'div:nth-of-type(3)'
+DETAILS_SELECTOR = 'span:nth-of-type(2)'
+PRICE_SELECTOR = 'div:nth-of-type(1)'
+
+# Precompiled XPath equivalents of the selectors above for the lxml backend.
+# XPath child::div[n] counts div siblings only, which is exactly CSS div:nth-of-type(n).
+_MAIN_XPATH = etree.XPath("(//main[contains(@class, 'page-container')])[1]")
+_ADS_CONTAINER_XPATH = etree.XPath(
+    "(.//div[3][parent::section[parent::div[count(preceding-sibling::div) = 1]"
+    "[parent::div[count(preceding-sibling::div) = 0]]]])[1]"
+)
+_WRAPPER_DIVS_XPATH = etree.XPath("div")
+_CHILD_ARTICLE_XPATH = etree.XPath("article[1]")
+_ARTICLE_XPATH = etree.XPath("(.//article)[1]")
+_IMAGE_XPATH = etree.XPath("(.//img[parent::div[parent::div[count(preceding-sibling::div) = 1]]])[1]")
+_INFO_DIV_XPATH = etree.XPath("(.//div[3])[1]")
+_NAME_XPATH = etree.XPath("(.//h2)[1]")
+_LINK_XPATH = etree.XPath("(.//a)[1]")
+_CAPTION_XPATH = etree.XPath(
+    "(.//span[contains(concat(' ', normalize-space(@class), ' '), ' text-caption ')])[1]"
+)
+_DETAILS_XPATH = etree.XPath("(.//span[2])[1]")
+_PRICE_XPATH = etree.XPath("(.//div[1])[1]")
+# BeautifulSoup's get_text() skips script, style and template contents
+_TEXT_XPATH = etree.XPath(
+    ".//text()[not(ancestor::script or ancestor::style or ancestor::template)]",
+    smart_strings=False
+)
+
+# Script tags that may carry the search results as hydration data, most specific first
+HYDRATION_SCRIPT_MARKERS = ('id="__NEXT_DATA__"', 'type="application/json"')
+
+# Backends take (page_html, current_year) and return a list of car_info dicts,
+# or None when they do not recognise the page layout.
+PARSER_BACKENDS = {}
+DEFAULT_BACKEND = "lxml"
+# Where to go when a backend rejects a page; bs4 never rejects one
+FALLBACK_BACKENDS = {"json": "lxml", "lxml": "bs4"}
+
+
+def register_parser_backend(name):
+    """Decorator registering a search page parser backend under a name"""
+    def decorator(func):
+        PARSER_BACKENDS[name] = func
+        return func
+    return decorator
+
+
+def parse_listings(page_html, backend: str = DEFAULT_BACKEND, reference_date: date = None) -> list:
+    """Parse the car listings on a Finn.no search result page
+
+    Ages are computed relative to reference_date (today by default). If the
+    chosen backend rejects the page, the next one in FALLBACK_BACKENDS is tried.
+    """
+    if not page_html:
+        return []
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend: {backend}")
+
+    current_year = (reference_date or date.today()).year
+    cars = None
+    while backend is not None and cars is None:
+        cars = PARSER_BACKENDS[backend](page_html, current_year)
+        backend = FALLBACK_BACKENDS.get(backend)
+    return cars or []
+
+
+def parse_listing_batch(page_html, backend: str = DEFAULT_BACKEND, reference_date: date = None) -> CarRecordBatch:
+    """Parse a search result page straight into a columnar CarRecordBatch"""
+    return CarRecordBatch.from_cars(parse_listings(page_html, backend, reference_date))
+
+
+def benchmark_backends(page_html, repeat: int = 5, reference_date: date = None) -> dict:
+    """Best-of-n parse time in milliseconds for every registered backend"""
+    current_year = (reference_date or date.today()).year
+    timings = {}
+    for name, backend in PARSER_BACKENDS.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            backend(page_html, current_year)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = round(best * 1000, 3)
+    return timings
+
+
+def new_car_info():
+    return {
+        'name': None,
+        'link': None,
+        'image_url': None,
+        'additional_info': None,
+        'year': None,
+        'mileage': None,
+        'price': None,
+        'age': None,
+        'km_per_year': None
+    }
+
+
+def absolute_ad_url(ad_url):
+    if ad_url.startswith('/'):
+        ad_url = BASE_URL + ad_url
+    return ad_url
+
+
+def finn_item_id(ad_url):
+    """Finn item id (finnkode) of an ad link, or None if the link has none"""
+    match = FINN_ITEM_ID_RE.search(ad_url or '')
+    return match.group(1) if match else None
+
+
+def apply_details_text(car_info, details_text, current_year):
+    """Fill year, age and mileage from the 'year · mileage' details line"""
+    year_match = YEAR_RE.search(details_text)
+    if year_match:
+        car_info['year'] = int(year_match.group(0))
+        car_info['age'] = current_year - car_info['year']
+
+    mileage_match = MILEAGE_RE.search(details_text)
+    if mileage_match:
+        mileage_str_cleaned = NON_DIGIT_RE.sub('', mileage_match.group(1).lower().replace('km', ''))
+        if mileage_str_cleaned.isdigit():
+            car_info['mileage'] = int(mileage_str_cleaned)
+
+
+def apply_km_per_year(car_info):
+    if car_info['mileage'] is not None and car_info['age'] is not None:
+        if car_info['age'] > 0:
+            car_info['km_per_year'] = round(car_info['mileage'] / car_info['age'])
+        elif car_info['age'] == 0:  # Car is from the current year
+            car_info['km_per_year'] = car_info['mileage']
+
+
+def apply_price_text(car_info, price_text):
+    if "solgt" in price_text.lower():
+        car_info['price'] = "Solgt"
+    else:
+        price_digits = NON_DIGIT_RE.sub('', price_text)
+        if price_digits:
+            car_info['price'] = int(price_digits)
+
+
+def number_cars(cars):
+    """Keep cars with a name and give them sequential ids"""
+    parsed_cars_list = []
+    for car_info in cars:
+        # Only add to list if essential data like name was found
+        if car_info.get('name'):
+            car_info['id'] = len(parsed_cars_list) + 1
+            parsed_cars_list.append(car_info)
+    return parsed_cars_list
+
+
+@register_parser_backend("bs4")
+def parse_page_cars_bs4(page_html, current_year):
+    """Reference parser using BeautifulSoup and soupsieve CSS selectors"""
+    soup = BeautifulSoup(page_html, 'lxml')
+
+    # Find the main tag with a class that starts with "page-container"
+    main_element = soup.find('main', class_=PAGE_CONTAINER_RE)
+    if not main_element:
+        return []
+
+    # CSS selector to navigate to the container of car listings
+    ads_container = main_element.select_one(ADS_CONTAINER_SELECTOR)
+    if not ads_container:
+        return []
+
+    cars = []
+    # Iterate through potential car ad wrappers (direct div children of the container)
+    for car_wrapper_div in ads_container.find_all('div', recursive=False):
+        article_element = car_wrapper_div.find('article', recursive=False)
+        if not article_element:
+            article_element = car_wrapper_div.find('article')
+            if not article_element:
+                continue  # This div doesn't contain an article, skip (e.g., it's an ad)
+
+        car_info = new_car_info()
+
+        image_tag = article_element.select_one(IMAGE_SELECTOR)
+        if image_tag:
+            car_info['image_url'] = image_tag.get('src') or image_tag.get('data-src')
+
+        # Main info container
+        info_div = article_element.select_one(INFO_DIV_SELECTOR)
+        if info_div:
+            # Car Name (Model) and Ad Link
+            name_tag = info_div.find('h2')
+            if name_tag:
+                car_info['name'] = name_tag.get_text(strip=True)
+                link_tag = name_tag.find('a')
+                if link_tag and link_tag.has_attr('href'):
+                    car_info['link'] = absolute_ad_url(link_tag['href'])
+
+            additional_info_tag = info_div.find('span', class_='text-caption')
+            if additional_info_tag:
+                car_info['additional_info'] = additional_info_tag.get_text(strip=True)
+
+            details_tag = info_div.select_one(DETAILS_SELECTOR)
+            if details_tag:
+                apply_details_text(car_info, details_tag.get_text(strip=True), current_year)
+            apply_km_per_year(car_info)
+
+            price_tag = info_div.select_one(PRICE_SELECTOR)
+            if price_tag:
+                apply_price_text(car_info, price_tag.get_text(strip=True))
+
+        cars.append(car_info)
+
+    return number_cars(cars)
+
+
+def _first(xpath, element):
+    result = xpath(element)
+    return result[0] if result else None
+
+
+def _text(element):
+    """Equivalent of BeautifulSoup's get_text(strip=True)"""
+    return ''.join(part.strip() for part in _TEXT_XPATH(element) if part.strip())
+
+
+@register_parser_backend("lxml")
+def parse_page_cars_lxml(page_html, current_year):
+    """Fast path over precompiled XPath objects, yielding the same car_info dicts as bs4"""
+    try:
+        tree = html.document_fromstring(page_html)
+    except (etree.ParserError, ValueError):
+        return None
+
+    main_element = _first(_MAIN_XPATH, tree)
+    if main_element is None:
+        return None
+    ads_container = _first(_ADS_CONTAINER_XPATH, main_element)
+    if ads_container is None:
+        return None
+
+    cars = []
+    for car_wrapper_div in _WRAPPER_DIVS_XPATH(ads_container):
+        article_element = _first(_CHILD_ARTICLE_XPATH, car_wrapper_div)
+        if article_element is None:
+            article_element = _first(_ARTICLE_XPATH, car_wrapper_div)
+            if article_element is None:
+                continue
+
+        car_info = new_car_info()
+
+        image_tag = _first(_IMAGE_XPATH, article_element)
+        if image_tag is not None:
+            car_info['image_url'] = image_tag.get('src') or image_tag.get('data-src')
+
+        info_div = _first(_INFO_DIV_XPATH, article_element)
+        if info_div is not None:
+            name_tag = _first(_NAME_XPATH, info_div)
+            if name_tag is not None:
+                car_info['name'] = _text(name_tag)
+                link_tag = _first(_LINK_XPATH, name_tag)
+                if link_tag is not None and 'href' in link_tag.attrib:
+                    car_info['link'] = absolute_ad_url(link_tag.get('href'))
+
+            additional_info_tag = _first(_CAPTION_XPATH, info_div)
+            if additional_info_tag is not None:
+                car_info['additional_info'] = _text(additional_info_tag)
+
+            details_tag = _first(_DETAILS_XPATH, info_div)
+            if details_tag is not None:
+                apply_details_text(car_info, _text(details_tag), current_year)
+            apply_km_per_year(car_info)
+
+            price_tag = _first(_PRICE_XPATH, info_div)
+            if price_tag is not None:
+                apply_price_text(car_info, _text(price_tag))
+
+        cars.append(car_info)
+
+    return number_cars(cars)
+
+
+def find_hydration_data(page_html):
+    """Locate and decode the first JSON hydration script block on the page"""
+    for marker in HYDRATION_SCRIPT_MARKERS:
+        position = page_html.find(marker)
+        while position != -1:
+            start = page_html.find('>', position) + 1
+            end = page_html.find('</script>', start)
+            if start and end != -1:
+                try:
+                    return json.loads(page_html[start:end])
+                except ValueError:
+                    pass
+            position = page_html.find(marker, position + len(marker))
+    return None
+
+
+def extract_total_results(page_html):
+    """Total number of search results reported on a result page, or None if not found"""
+    data = find_hydration_data(page_html)
+    if data is not None:
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                result_size = node.get('result_size')
+                if isinstance(result_size, dict) and isinstance(result_size.get('match_count'), int):
+                    return result_size['match_count']
+                stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+            elif isinstance(node, list):
+                stack.extend(value for value in node if isinstance(value, (dict, list)))
+
+    match = TOTAL_RESULTS_RE.search(page_html)
+    if match:
+        return int(NON_DIGIT_RE.sub('', match.group(1).replace('&nbsp;', '').replace('&#160;', '')))
+    return None
+
+
+def find_search_docs(data):
+    """Find the list of ad documents (dicts with a 'heading') inside the hydration data"""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            docs = node.get('docs')
+            if isinstance(docs, list) and docs and isinstance(docs[0], dict) and 'heading' in docs[0]:
+                return docs
+            stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(value for value in node if isinstance(value, (dict, list)))
+    return None
+
+
+def _is_sold(doc):
+    for label in doc.get('labels') or []:
+        if isinstance(label, dict) and (label.get('id') == 'sold' or str(label.get('text', '')).lower() == 'solgt'):
+            return True
+    return 'sold' in (doc.get('flags') or [])
+
+
+@register_parser_backend("json")
+def parse_page_cars_json(page_html, current_year):
+    """Build the car records from the embedded search JSON instead of walking the DOM"""
+    data = find_hydration_data(page_html)
+    docs = find_search_docs(data) if data is not None else None
+    if docs is None:
+        return None
+
+    cars = []
+    for doc in docs:
+        car_info = new_car_info()
+        car_info['name'] = (doc.get('heading') or '').strip()
+
+        if doc.get('canonical_url'):
+            car_info['link'] = absolute_ad_url(doc['canonical_url'])
+        elif doc.get('ad_id'):
+            car_info['link'] = f"{BASE_URL}/mobility/item/{doc['ad_id']}"
+
+        image = doc.get('image')
+        if isinstance(image, dict):
+            car_info['image_url'] = image.get('url')
+
+        if doc.get('subheading'):
+            car_info['additional_info'] = doc['subheading'].strip()
+
+        if isinstance(doc.get('year'), int):
+            car_info['year'] = doc['year']
+            car_info['age'] = current_year - car_info['year']
+        if isinstance(doc.get('mileage'), int):
+            car_info['mileage'] = doc['mileage']
+        apply_km_per_year(car_info)
+
+        price = doc.get('price')
+        if _is_sold(doc):
+            car_info['price'] = "Solgt"
+        elif isinstance(price, dict) and isinstance(price.get('amount'), (int, float)):
+            car_info['price'] = int(price['amount'])
+
+        cars.append(car_info)
+
+    return number_cars(cars)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from listing_parser import finn_item_id
+from response_cache import CACHE_DIR
+
+# Fields that make up a listing's content; id, age and km_per_year are derived
+FINGERPRINT_FIELDS = ('name', 'additional_info', 'image_url', 'year', 'mileage', 'price')
+
+
+def search_key(url: str) -> str:
+    """Stable key for a saved search: the URL without paging, query parameters sorted"""
+    parts = urlsplit(url)
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != 'page')
+    return urlunsplit(parts._replace(query=urlencode(query), fragment=''))
+
+
+def listing_key(car: dict):
+    """Finn item id of a listing, falling back to its link when the id is missing"""
+    return finn_item_id(car.get('link')) or car.get('link')
+
+
+def fingerprint(car: dict) -> str:
+    """Content hash of a listing, so unchanged listings can be skipped"""
+    content = json.dumps([car.get(field) for field in FINGERPRINT_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def is_sold(car: dict) -> bool:
+    return car.get('price') == "Solgt"
+
+
+class ListingStateStore:
+    """Last seen state of every listing per saved search, for incremental re-scrapes"""
+
+    def __init__(self, path: str = None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "listing_state.sqlite")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS listings (
+                search_key TEXT,
+                item_id TEXT,
+                fingerprint TEXT,
+                data TEXT,
+                first_seen REAL,
+                last_seen REAL,
+                PRIMARY KEY (search_key, item_id)
+            )
+        """)
+        self._conn.commit()
+
+    def load(self, key: str) -> dict:
+        """Stored listings of a search as {item_id: (fingerprint, car)}"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_id, fingerprint, data FROM listings WHERE search_key = ?", (key,)
+            ).fetchall()
+        return {item_id: (stored_fingerprint, json.loads(data)) for item_id, stored_fingerprint, data in rows}
+
+    def update(self, key: str, cars: list, complete: bool = True) -> dict:
+        """Compare a fresh scrape with the stored state, store it and report what changed
+
+        Returns new, price_changed, sold, changed (other content) and removed listings
+        plus the number of unchanged ones. Listings are only reported as removed when
+        the scrape covered the whole search (complete=True).
+        """
+        previous = self.load(key)
+        changes = {"new": [], "price_changed": [], "sold": [], "changed": [], "removed": [], "unchanged": 0}
+        current = {}
+        for car in cars:
+            item_id = listing_key(car)
+            if item_id is None or item_id in current:
+                continue
+            current[item_id] = (fingerprint(car), car)
+
+            if item_id not in previous:
+                changes["new"].append(car)
+                continue
+            old_fingerprint, old_car = previous[item_id]
+            if current[item_id][0] == old_fingerprint:
+                changes["unchanged"] += 1
+            elif is_sold(car) and not is_sold(old_car):
+                changes["sold"].append(car)
+            elif car.get('price') != old_car.get('price'):
+                changes["price_changed"].append({**car, "previous_price": old_car.get('price')})
+            else:
+                changes["changed"].append(car)
+
+        removed_ids = [item_id for item_id in previous if item_id not in current] if complete else []
+        changes["removed"] = [previous[item_id][1] for item_id in removed_ids]
+
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(search_key, item_id) DO UPDATE SET "
+                    "fingerprint = excluded.fingerprint, data = excluded.data, last_seen = excluded.last_seen",
+                    [(key, item_id, car_fingerprint, json.dumps(car, ensure_ascii=False), now, now)
+                     for item_id, (car_fingerprint, car) in current.items()]
+                )
+                self._conn.executemany(
+                    "DELETE FROM listings WHERE search_key = ? AND item_id = ?",
+                    [(key, item_id) for item_id in removed_ids]
+                )
+        return changes
+
+    def clear(self, key: str = None):
+        with self._lock:
+            with self._conn:
+                if key is None:
+                    self._conn.execute("DELETE FROM listings")
+                else:
+                    self._conn.execute("DELETE FROM listings WHERE search_key = ?", (key,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_listing_state() -> ListingStateStore:
+    """Return the process-wide listing state store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ListingStateStore()
+        return _store
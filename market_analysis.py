@@ -0,0 +1,319 @@
+import bisect
+import hashlib
+import math
+import pickle
+import threading
+from collections import Counter
+
+from cachetools import LRUCache
+
+from car_records import CarRecordBatch, as_number
+from dataset_registry import resolve_cars
+from listing_state import listing_key
+
+ANALYSIS_CACHE_SIZE = 128  # Analysis results kept per process
+VARIANCE_EPSILON = 1e-9  # Standard deviations below this share of the mean are rounding residue
+
+
+def as_record_batch(cars) -> CarRecordBatch:
+    """Accept either a CarRecordBatch or the list of car dicts the scraper returns"""
+    if isinstance(cars, CarRecordBatch):
+        return cars
+    return CarRecordBatch.from_cars(cars)
+
+
+def analyze_market(cars, analysis_type: str = "basic") -> dict:
+    """Market statistics computed from the typed columns, without to_numeric on the price"""
+    batch = as_record_batch(cars)
+    df = batch.to_pandas()
+    sold = df.pop('sold')
+
+    # Filter out sold cars for price analysis
+    available_cars = df[~sold]
+    has_available = not available_cars.empty
+
+    analysis = {
+        "total_cars": len(df),
+        "available_cars": len(available_cars),
+        "sold_cars": int(sold.sum()),
+        "avg_price": float(available_cars['price'].mean()) if has_available else None,
+        "median_price": float(available_cars['price'].median()) if has_available else None,
+        "price_range": {
+            "min": float(available_cars['price'].min()) if has_available else None,
+            "max": float(available_cars['price'].max()) if has_available else None
+        },
+        "avg_mileage": float(df['mileage'].mean()),
+        "avg_age": float(df['age'].mean())
+    }
+
+    if analysis_type == "detailed":
+        analysis.update({
+            "mileage_distribution": df['mileage'].describe().to_dict(),
+            "year_distribution": df['year'].value_counts().to_dict(),
+            "price_per_km": calculate_price_per_km(available_cars)
+        })
+
+    return analysis
+
+
+def calculate_price_per_km(df):
+    """Calculate price per kilometer for available cars"""
+    if 'price' in df.columns and 'mileage' in df.columns:
+        valid_data = df[(df['price'].notna()) & (df['mileage'].notna()) & (df['mileage'] > 0)]
+        if not valid_data.empty:
+            return float((valid_data['price'] / valid_data['mileage']).mean())
+    return None
+
+
+class AnalysisCache:
+    """LRU cache of analyze_market results keyed by dataset fingerprint and analysis_type"""
+
+    def __init__(self, maxsize: int = ANALYSIS_CACHE_SIZE):
+        self._results = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            analysis = self._results.get(key)
+            self.stats["hits" if analysis is not None else "misses"] += 1
+            return analysis
+
+    def put(self, key, analysis: dict):
+        with self._lock:
+            if key not in self._results and len(self._results) >= self._results.maxsize:
+                self.stats["evictions"] += 1
+            self._results[key] = analysis
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._results),
+                "max_entries": self._results.maxsize,
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None
+            }
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+analysis_cache = AnalysisCache()
+
+
+def dataset_fingerprint(cars_data=None, dataset_id: str = None) -> str:
+    """Key for the input cars: the dataset_id (already a content hash) or a hash of cars_data
+
+    Inline cars are hashed through pickle, several times faster than JSON. The
+    cache lives in one process, so the bytes only need to be stable there; a
+    differently built but equal list can at worst miss, never hit wrongly.
+    """
+    if dataset_id:
+        return f"dataset:{dataset_id}"
+    if isinstance(cars_data, CarRecordBatch):
+        cars_data = cars_data.to_cars()
+    return "inline:" + hashlib.sha1(pickle.dumps(cars_data, protocol=5)).hexdigest()
+
+
+def cached_analysis(cars_data=None, analysis_type: str = "basic", dataset_id: str = None) -> dict:
+    """analyze_market for a dataset_id or inline cars, reusing the result for identical input
+
+    The returned dict is shared with the cache and must not be modified.
+    """
+    key = (dataset_fingerprint(cars_data, dataset_id), analysis_type)
+    analysis = analysis_cache.get(key)
+    if analysis is None:
+        cars = resolve_cars({"cars_data": cars_data, "dataset_id": dataset_id})
+        analysis = analyze_market(cars, analysis_type)
+        analysis_cache.put(key, analysis)
+    return analysis
+
+
+class RunningColumn:
+    """Count, mean and variance (Welford) of a column that values can leave again
+
+    With keep_sorted the values are also kept in a sorted list, which gives the
+    exact min, max and quantiles for O(log n) search plus a memmove per change.
+    """
+
+    def __init__(self, keep_sorted: bool = True):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.sorted_values = [] if keep_sorted else None
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        if self.sorted_values is not None:
+            bisect.insort(self.sorted_values, value)
+
+    def remove(self, value):
+        if self.sorted_values is not None:
+            del self.sorted_values[bisect.bisect_left(self.sorted_values, value)]
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self._m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self._m2 = max(self._m2 - delta * (value - self.mean), 0.0)
+
+    def average(self) -> float:
+        return self.mean if self.count else math.nan
+
+    def std(self) -> float:
+        if self.count < 2:
+            return math.nan
+        # Removals leave rounding residue in the running variance, so identical values
+        # (known exactly from the sorted list) and residue at float precision report 0
+        if self.sorted_values is not None and self.sorted_values[0] == self.sorted_values[-1]:
+            return 0.0
+        variance = self._m2 / (self.count - 1)
+        if variance <= (VARIANCE_EPSILON * self.mean) ** 2:
+            return 0.0
+        return math.sqrt(variance)
+
+    def quantile(self, q: float) -> float:
+        """Linear interpolation between the closest ranks, as pandas does"""
+        if not self.count:
+            return math.nan
+        position = q * (self.count - 1)
+        lower = math.floor(position)
+        upper = min(lower + 1, self.count - 1)
+        fraction = position - lower
+        return float(self.sorted_values[lower] + (self.sorted_values[upper] - self.sorted_values[lower]) * fraction)
+
+    def describe(self) -> dict:
+        return {
+            "count": float(self.count),
+            "mean": self.average(),
+            "std": self.std(),
+            "min": self.quantile(0),
+            "25%": self.quantile(0.25),
+            "50%": self.quantile(0.5),
+            "75%": self.quantile(0.75),
+            "max": self.quantile(1)
+        }
+
+
+class IncrementalMarketStats:
+    """analyze_market statistics maintained from listing deltas instead of recomputed
+
+    Listings are keyed by their Finn item id, so adding a listing that is
+    already known replaces it. Each add or remove costs O(log n) per listing,
+    and analysis() reads the aggregates without touching the listings.
+    """
+
+    def __init__(self):
+        self._cars = {}
+        self._lock = threading.Lock()
+        self.sold_cars = 0
+        self.price = RunningColumn()
+        self.mileage = RunningColumn()
+        self.age = RunningColumn(keep_sorted=False)
+        self.price_per_km = RunningColumn(keep_sorted=False)
+        self.years = Counter()
+        self.missing_years = 0
+
+    def __len__(self):
+        return len(self._cars)
+
+    def _apply(self, car: dict, sign: int):
+        update = RunningColumn.add if sign > 0 else RunningColumn.remove
+        mileage = as_number(car.get('mileage'))
+        age = as_number(car.get('age'))
+        year = as_number(car.get('year'))
+        if mileage is not None:
+            update(self.mileage, mileage)
+        if age is not None:
+            update(self.age, age)
+        if year is not None:
+            self.years[year] += sign
+            if not self.years[year]:
+                del self.years[year]
+        else:
+            self.missing_years += sign
+
+        if car.get('price') == "Solgt":
+            self.sold_cars += sign
+            return
+        price = as_number(car.get('price'))
+        if price is not None:
+            update(self.price, price)
+            if mileage is not None and mileage > 0:
+                update(self.price_per_km, price / mileage)
+
+    def add(self, cars: list):
+        """Add new listings or replace the stored version of known ones"""
+        with self._lock:
+            for car in cars:
+                key = listing_key(car)
+                if key is None:
+                    continue
+                car = {field: value for field, value in car.items() if field != 'previous_price'}
+                if key in self._cars:
+                    self._apply(self._cars[key], -1)
+                self._cars[key] = car
+                self._apply(car, 1)
+
+    def remove(self, cars: list):
+        """Drop listings (cars or item ids) that are no longer on the market"""
+        with self._lock:
+            for car in cars:
+                key = listing_key(car) if isinstance(car, dict) else car
+                stored = self._cars.pop(key, None)
+                if stored is not None:
+                    self._apply(stored, -1)
+
+    def apply_changes(self, changes: dict):
+        """Ingest a fetch_finn_changes / ListingStateStore.update result"""
+        self.add([car for group in ("new", "price_changed", "sold", "changed") for car in changes.get(group, [])])
+        self.remove(changes.get("removed", []))
+
+    def analysis(self, analysis_type: str = "basic") -> dict:
+        """The analyze_market result for the current listings"""
+        with self._lock:
+            total_cars = len(self._cars)
+            available_cars = total_cars - self.sold_cars
+            has_available = available_cars > 0
+            analysis = {
+                "total_cars": total_cars,
+                "available_cars": available_cars,
+                "sold_cars": self.sold_cars,
+                "avg_price": self.price.average() if has_available else None,
+                "median_price": self.price.quantile(0.5) if has_available else None,
+                "price_range": {
+                    "min": self.price.quantile(0) if has_available else None,
+                    "max": self.price.quantile(1) if has_available else None
+                },
+                "avg_mileage": self.mileage.average(),
+                "avg_age": self.age.average()
+            }
+
+            if analysis_type == "detailed":
+                # Like value_counts: float years once any year is missing, most common first
+                year_type = float if self.missing_years else int
+                analysis.update({
+                    "mileage_distribution": self.mileage.describe(),
+                    "year_distribution": {year_type(year): count for year, count in self.years.most_common()},
+                    "price_per_km": self.price_per_km.mean if self.price_per_km.count else None
+                })
+            return analysis
+
+
+_market_stats = {}
+_market_stats_lock = threading.Lock()
+
+
+def get_market_stats(market_key: str, reset: bool = False) -> IncrementalMarketStats:
+    """Return the incremental statistics kept for a polled market view (e.g. a search_key)"""
+    with _market_stats_lock:
+        if reset or market_key not in _market_stats:
+            _market_stats[market_key] = IncrementalMarketStats()
+        return _market_stats[market_key]
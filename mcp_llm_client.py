@@ -24,7 +24,8 @@ class MCPLLMClient:
                         "type": "object",
                         "properties": {
                             "url": {"type": "string", "description": "Finn.no search URL"},
-                            "max_pages": {"type": "integer", "default": 1, "description": "Maximum pages to scrape"}
+                            "max_pages": {"type": "integer", "default": 1, "description": "Maximum pages to scrape"},
+                            "auto_paginate": {"type": "boolean", "default": False, "description": "Fetch every result page until the search is exhausted"}
                         },
                         "required": ["url"]
                     }
@@ -38,10 +39,10 @@ class MCPLLMClient:
                     "parameters": {
                         "type": "object",
                         "properties": {
-                            "cars_data": {"type": "array", "description": "Array of car objects"},
+                            "dataset_id": {"type": "string", "description": "dataset_id returned by fetch_finn_data"},
                             "analysis_type": {"type": "string", "enum": ["basic", "detailed", "investment"], "default": "basic"}
                         },
-                        "required": ["cars_data"]
+                        "required": ["dataset_id"]
                     }
                 }
             },
@@ -53,12 +54,13 @@ class MCPLLMClient:
                     "parameters": {
                         "type": "object",
                         "properties": {
-                            "cars_data": {"type": "array"},
+                            "dataset_id": {"type": "string", "description": "dataset_id returned by fetch_finn_data"},
                             "max_price": {"type": "integer"},
                             "max_mileage": {"type": "integer"},
-                            "min_year": {"type": "integer"}
+                            "min_year": {"type": "integer"},
+                            "scoring_profile": {"type": "string", "enum": ["default", "low_mileage", "budget", "newest"], "default": "default"}
                         },
-                        "required": ["cars_data"]
+                        "required": ["dataset_id"]
                     }
                 }
             }
@@ -71,6 +73,7 @@ class MCPLLMClient:
         from test_webscraper import test_fetch_finn_data
         from test_data_analysis import test_analyze_car_market
         from test_mcp_client import test_find_best_deals
+        from finn_search import FINN_MAX_PAGES
         
         if conversation_history is None:
             conversation_history = []
@@ -86,8 +89,8 @@ When users ask about cars, use these tools intelligently to provide comprehensiv
 
 If a user provides a Finn.no URL or asks to analyze cars, use the tools in this order:
 1. First fetch the data with fetch_finn_data
-2. Then analyze it with analyze_car_market  
-3. If they want recommendations, use find_best_deals
+2. Then analyze it with analyze_car_market, passing the dataset_id from fetch_finn_data
+3. If they want recommendations, use find_best_deals with the same dataset_id
 
 Be conversational and explain your findings clearly."""
 
@@ -124,9 +127,16 @@ Be conversational and explain your findings clearly."""
                     
                     # Execute the MCP tool
                     if function_name == "fetch_finn_data":
-                        result = await test_fetch_finn_data(arguments["url"], arguments.get("max_pages", 1))
+                        # Only the dataset_id goes back into the prompt, not the cars themselves
+                        auto_paginate = arguments.get("auto_paginate", False)
+                        result = await test_fetch_finn_data(
+                            arguments["url"], arguments.get("max_pages", FINN_MAX_PAGES if auto_paginate else 1),
+                            auto_paginate=auto_paginate, include_data=False
+                        )
                     elif function_name == "analyze_car_market":
-                        result = await test_analyze_car_market(arguments["cars_data"], arguments.get("analysis_type", "basic"))
+                        result = await test_analyze_car_market(
+                            arguments.get("cars_data"), arguments.get("analysis_type", "basic"), arguments.get("dataset_id")
+                        )
                     elif function_name == "find_best_deals":
                         result = await test_find_best_deals(arguments)
                     else:
@@ -0,0 +1 @@
+"""MCP servers run as modules, e.g. python -m mcp_servers.car_database"""
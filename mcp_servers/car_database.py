@@ -0,0 +1,468 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from mcp.server import Server
+from mcp.types import Tool, TextContent
+
+from listing_parser import finn_item_id
+from specifications import SPEC_FIELDS, normalize_specifications
+from vocabulary import get_equipment_vocabulary, get_vocabulary
+from response_cache import CACHE_DIR
+
+app = Server("car_database")
+
+DEFAULT_QUERY_LIMIT = 100
+SORT_COLUMNS = ("price", "year", "mileage", "km_per_year", "last_seen")
+# query_listings filters answered from the specs table: argument -> (column, operator)
+SPEC_FILTERS = {
+    "min_power_hp": ("power_hp", ">="),
+    "max_power_hp": ("power_hp", "<="),
+    "fuel": ("fuel", "="),
+    "gearbox": ("gearbox", "="),
+    "drivetrain": ("drivetrain", "="),
+    "max_co2": ("co2", "<="),
+    "min_range_km": ("range_km", ">="),
+    "min_battery_kwh": ("battery_kwh", ">="),
+}
+
+
+def model_key(name):
+    """Make and model of a listing title, e.g. 'Toyota RAV4 2.5 Hybrid' -> 'toyota rav4'"""
+    return " ".join((name or "").lower().split()[:2]) or None
+
+
+def registration_number_from_specs(specifications):
+    for key, value in (specifications or {}).items():
+        if 'registreringsnummer' in key.lower() or 'regnr' in key.lower():
+            return value
+    return None
+
+
+class CarDatabase:
+    """Embedded SQLite store of scraped listings, listing details, heftelser and EU-kontroll results"""
+
+    def __init__(self, path: str = None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "car_database.sqlite")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS listings (
+                item_id TEXT PRIMARY KEY,
+                link TEXT,
+                name TEXT,
+                model_key TEXT,
+                year INTEGER,
+                mileage INTEGER,
+                price INTEGER,
+                sold INTEGER,
+                km_per_year INTEGER,
+                data TEXT,
+                first_seen REAL,
+                last_seen REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_listings_price ON listings(price);
+            CREATE INDEX IF NOT EXISTS idx_listings_year ON listings(year);
+            CREATE INDEX IF NOT EXISTS idx_listings_mileage ON listings(mileage);
+            CREATE INDEX IF NOT EXISTS idx_listings_km_per_year ON listings(km_per_year);
+            CREATE INDEX IF NOT EXISTS idx_listings_model ON listings(model_key);
+            CREATE INDEX IF NOT EXISTS idx_listings_first_seen ON listings(first_seen);
+            CREATE INDEX IF NOT EXISTS idx_listings_last_seen ON listings(last_seen);
+
+            CREATE TABLE IF NOT EXISTS details (
+                item_id TEXT PRIMARY KEY,
+                url TEXT,
+                registration_number TEXT,
+                data TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_details_registration ON details(registration_number);
+
+            CREATE TABLE IF NOT EXISTS equipment (
+                item_id TEXT,
+                code TEXT,
+                PRIMARY KEY (item_id, code)
+            );
+            CREATE INDEX IF NOT EXISTS idx_equipment_code ON equipment(code);
+
+            CREATE TABLE IF NOT EXISTS specs (
+                item_id TEXT PRIMARY KEY,
+                power_hp INTEGER,
+                fuel TEXT,
+                gearbox TEXT,
+                drivetrain TEXT,
+                first_registration TEXT,
+                co2 INTEGER,
+                range_km INTEGER,
+                battery_kwh REAL,
+                reg_number TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_specs_power_hp ON specs(power_hp);
+            CREATE INDEX IF NOT EXISTS idx_specs_fuel ON specs(fuel);
+            CREATE INDEX IF NOT EXISTS idx_specs_gearbox ON specs(gearbox);
+            CREATE INDEX IF NOT EXISTS idx_specs_drivetrain ON specs(drivetrain);
+            CREATE INDEX IF NOT EXISTS idx_specs_co2 ON specs(co2);
+            CREATE INDEX IF NOT EXISTS idx_specs_range_km ON specs(range_km);
+            CREATE INDEX IF NOT EXISTS idx_specs_battery_kwh ON specs(battery_kwh);
+
+            CREATE TABLE IF NOT EXISTS heftelser (
+                registration_number TEXT PRIMARY KEY,
+                data TEXT,
+                updated_at REAL
+            );
+
+            CREATE TABLE IF NOT EXISTS eu_kontroll (
+                registration_number TEXT PRIMARY KEY,
+                data TEXT,
+                updated_at REAL
+            );
+        """)
+        self._conn.commit()
+
+    def upsert_listings(self, cars: list) -> int:
+        """Insert or update listings from fetch_finn_data output in one transaction"""
+        now = time.time()
+        rows = []
+        for car in cars:
+            item_id = finn_item_id(car.get('link')) or car.get('link')
+            if not item_id:
+                continue
+            price = car.get('price')
+            rows.append((
+                item_id, car.get('link'), car.get('name'), model_key(car.get('name')),
+                car.get('year'), car.get('mileage'),
+                price if isinstance(price, int) else None, int(price == "Solgt"),
+                car.get('km_per_year'), json.dumps(car, ensure_ascii=False), now, now
+            ))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("""
+                    INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(item_id) DO UPDATE SET
+                        link = excluded.link, name = excluded.name, model_key = excluded.model_key,
+                        year = excluded.year, mileage = excluded.mileage, price = excluded.price,
+                        sold = excluded.sold, km_per_year = excluded.km_per_year,
+                        data = excluded.data, last_seen = excluded.last_seen
+                """, rows)
+        return len(rows)
+
+    def upsert_details(self, details_list: list) -> int:
+        """Store extract_car_details output, filing heftelser under the registration number"""
+        now = time.time()
+        detail_rows = []
+        heftelser_rows = []
+        equipment_rows = []
+        spec_rows = []
+        vocabulary = get_equipment_vocabulary()
+        for details in details_list:
+            if not details.get('url') or details.get('error'):
+                continue
+            registration_number = registration_number_from_specs(details.get('specifications'))
+            item_id = finn_item_id(details['url']) or details['url']
+            detail_rows.append((item_id, details['url'], registration_number,
+                                json.dumps(details, ensure_ascii=False), now))
+            # Details stored before equipment codes existed are canonicalized here
+            codes = details.get('equipment_codes')
+            if codes is None:
+                codes = vocabulary.canonicalize(details.get('equipment') or [])
+            equipment_rows.extend((item_id, code) for code in codes)
+            specs = details.get('normalized_specs') or normalize_specifications(details.get('specifications'))
+            spec_rows.append((item_id, *(specs.get(field) for field in SPEC_FIELDS)))
+            heftelser_info = details.get('heftelser_info')
+            if registration_number and heftelser_info and not heftelser_info.get('error'):
+                heftelser_rows.append((registration_number, json.dumps(heftelser_info, ensure_ascii=False), now))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?)", detail_rows)
+                self._conn.executemany("DELETE FROM equipment WHERE item_id = ?", [(row[0],) for row in detail_rows])
+                self._conn.executemany("INSERT OR IGNORE INTO equipment VALUES (?, ?)", equipment_rows)
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO specs VALUES ({', '.join('?' * (len(SPEC_FIELDS) + 1))})", spec_rows
+                )
+                self._conn.executemany("INSERT OR REPLACE INTO heftelser VALUES (?, ?, ?)", heftelser_rows)
+        return len(detail_rows)
+
+    def upsert_eu_kontroll(self, registration_number: str, eu_kontroll_info: dict):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO eu_kontroll VALUES (?, ?, ?)",
+                    (registration_number, json.dumps(eu_kontroll_info, ensure_ascii=False), time.time())
+                )
+
+    def query_listings(self, min_price: int = None, max_price: int = None, min_year: int = None,
+                       max_year: int = None, max_mileage: int = None, max_km_per_year: int = None,
+                       model: str = None, equipment: list = None, include_sold: bool = False,
+                       order_by: str = "price", descending: bool = False, limit: int = DEFAULT_QUERY_LIMIT,
+                       **spec_filters) -> list:
+        """Filtered listings, answered from the indexes instead of a fresh scrape
+
+        spec_filters are the SPEC_FILTERS arguments, e.g. min_power_hp=200 or fuel="electric".
+        """
+        if order_by not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort column '{order_by}', expected one of {', '.join(SORT_COLUMNS)}")
+
+        conditions = []
+        params = []
+        for column, operator, value in (
+            ("price", ">=", min_price), ("price", "<=", max_price),
+            ("year", ">=", min_year), ("year", "<=", max_year),
+            ("mileage", "<=", max_mileage), ("km_per_year", "<=", max_km_per_year),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        if model:
+            # Prefix match as a range so the model index is used
+            prefix = model_key(model)
+            conditions.append("model_key >= ? AND model_key < ?")
+            params.extend([prefix, prefix + "\uffff"])
+        if equipment:
+            # Listings whose stored details have every requested equipment code
+            codes = sorted(set(equipment))
+            conditions.append(
+                f"item_id IN (SELECT item_id FROM equipment WHERE code IN ({', '.join('?' * len(codes))}) "
+                "GROUP BY item_id HAVING COUNT(*) = ?)"
+            )
+            params.extend([*codes, len(codes)])
+        spec_conditions = []
+        for argument, value in spec_filters.items():
+            if argument not in SPEC_FILTERS:
+                raise TypeError(f"query_listings() got an unexpected keyword argument '{argument}'")
+            if value is not None:
+                column, operator = SPEC_FILTERS[argument]
+                spec_conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        if spec_conditions:
+            # Listings whose stored details have normalized specifications matching every filter
+            conditions.append(f"item_id IN (SELECT item_id FROM specs WHERE {' AND '.join(spec_conditions)})")
+        if not include_sold:
+            conditions.append("sold = 0")
+
+        sql = "SELECT data FROM listings"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {order_by} IS NULL, {order_by} {'DESC' if descending else 'ASC'} LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def price_observations(self) -> list:
+        """(model_key, year, mileage, price) of every unsold listing with all three numbers"""
+        with self._lock:
+            return self._conn.execute("""
+                SELECT model_key, year, mileage, price FROM listings
+                WHERE sold = 0 AND price IS NOT NULL AND year IS NOT NULL AND mileage IS NOT NULL
+            """).fetchall()
+
+    def listings_since(self, first_seen_after: float = 0) -> list:
+        """(first_seen, name, additional_info, year, mileage, price) of unsold listings first seen after a time"""
+        with self._lock:
+            return self._conn.execute("""
+                SELECT first_seen, name, json_extract(data, '$.additional_info'), year, mileage, price
+                FROM listings
+                WHERE first_seen > ? AND sold = 0 AND price IS NOT NULL AND year IS NOT NULL AND mileage IS NOT NULL
+                ORDER BY first_seen
+            """, (first_seen_after,)).fetchall()
+
+    def listings_seen_since(self, last_seen_after: float = 0) -> list:
+        """(item_id, model_key, year, mileage, price, km_per_year, sold, last_seen) of listings stored after a time"""
+        with self._lock:
+            return self._conn.execute("""
+                SELECT item_id, model_key, year, mileage, price, km_per_year, sold, last_seen
+                FROM listings WHERE last_seen > ? ORDER BY last_seen
+            """, (last_seen_after,)).fetchall()
+
+    def listings_by_id(self, item_ids: list) -> dict:
+        """Stored listings as {item_id: car} for the given ids"""
+        if not item_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT item_id, data FROM listings WHERE item_id IN ({', '.join('?' * len(item_ids))})",
+                list(item_ids)
+            ).fetchall()
+        return {item_id: json.loads(data) for item_id, data in rows}
+
+    def get_listing(self, item_id: str) -> dict:
+        """A listing with its stored details, heftelser and EU-kontroll results"""
+        item_id = finn_item_id(item_id) or item_id
+        with self._lock:
+            listing = self._conn.execute("SELECT data FROM listings WHERE item_id = ?", (item_id,)).fetchone()
+            details = self._conn.execute(
+                "SELECT registration_number, data FROM details WHERE item_id = ?", (item_id,)
+            ).fetchone()
+            record = {
+                "listing": json.loads(listing[0]) if listing else None,
+                "details": json.loads(details[1]) if details else None,
+                "heftelser": None,
+                "eu_kontroll": None
+            }
+            if details and details[0]:
+                for table in ("heftelser", "eu_kontroll"):
+                    row = self._conn.execute(
+                        f"SELECT data FROM {table} WHERE registration_number = ?", (details[0],)
+                    ).fetchone()
+                    record[table] = json.loads(row[0]) if row else None
+        return record
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("listings", "details", "equipment", "specs", "heftelser", "eu_kontroll")
+            }
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_car_database() -> CarDatabase:
+    """Return the process-wide car database"""
+    global _database
+    with _database_lock:
+        if _database is None:
+            _database = CarDatabase()
+        return _database
+
+
+@app.list_tools()
+async def list_tools():
+    spec_values = get_vocabulary()["specification_values"]
+    return [
+        Tool(
+            name="upsert_listings",
+            description="Store listings from fetch_finn_data in the local car database",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "cars_data": {"type": "array", "description": "Array of car objects"}
+                },
+                "required": ["cars_data"]
+            }
+        ),
+        Tool(
+            name="upsert_car_details",
+            description="Store extract_car_details results (including heftelser) in the local car database",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "details": {"type": "array", "description": "Array of car detail objects"}
+                },
+                "required": ["details"]
+            }
+        ),
+        Tool(
+            name="upsert_eu_kontroll",
+            description="Store an EU-kontroll result for a registration number",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "registration_number": {"type": "string"},
+                    "eu_kontroll_info": {"type": "object"}
+                },
+                "required": ["registration_number", "eu_kontroll_info"]
+            }
+        ),
+        Tool(
+            name="query_listings",
+            description="Query stored listings by price, year, mileage, km per year, model, equipment and specifications without re-scraping",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "min_price": {"type": "integer"},
+                    "max_price": {"type": "integer"},
+                    "min_year": {"type": "integer"},
+                    "max_year": {"type": "integer"},
+                    "max_mileage": {"type": "integer"},
+                    "max_km_per_year": {"type": "integer"},
+                    "model": {"type": "string", "description": "Make and model, e.g. 'Toyota RAV4'"},
+                    "equipment": {"type": "array", "items": {"type": "string"}, "description": "Equipment codes every listing must have, e.g. ['tow_hitch', 'heated_seats']"},
+                    "min_power_hp": {"type": "integer"},
+                    "max_power_hp": {"type": "integer"},
+                    "fuel": {"type": "string", "enum": list(spec_values["fuel"])},
+                    "gearbox": {"type": "string", "enum": list(spec_values["gearbox"])},
+                    "drivetrain": {"type": "string", "enum": list(spec_values["drivetrain"])},
+                    "max_co2": {"type": "integer", "description": "Maximum CO2 emissions in g/km"},
+                    "min_range_km": {"type": "integer"},
+                    "min_battery_kwh": {"type": "number"},
+                    "include_sold": {"type": "boolean", "default": False},
+                    "order_by": {"type": "string", "enum": list(SORT_COLUMNS), "default": "price"},
+                    "descending": {"type": "boolean", "default": False},
+                    "limit": {"type": "integer", "default": DEFAULT_QUERY_LIMIT}
+                }
+            }
+        ),
+        Tool(
+            name="get_listing",
+            description="Get a stored listing with its details, heftelser and EU-kontroll results",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "item_id": {"type": "string", "description": "Finn item id or listing URL"}
+                },
+                "required": ["item_id"]
+            }
+        ),
+        Tool(
+            name="get_database_stats",
+            description="Show the number of stored listings, details, heftelser and EU-kontroll results",
+            inputSchema={"type": "object", "properties": {}}
+        )
+    ]
+
+@app.call_tool()
+async def call_tool(name: str, arguments: dict):
+    try:
+        database = get_car_database()
+        if name == "upsert_listings":
+            stored = await asyncio.to_thread(database.upsert_listings, arguments["cars_data"])
+            result = {"success": True, "stored": stored}
+        elif name == "upsert_car_details":
+            stored = await asyncio.to_thread(database.upsert_details, arguments["details"])
+            result = {"success": True, "stored": stored}
+        elif name == "upsert_eu_kontroll":
+            await asyncio.to_thread(
+                database.upsert_eu_kontroll, arguments["registration_number"], arguments["eu_kontroll_info"]
+            )
+            result = {"success": True}
+        elif name == "query_listings":
+            start = time.perf_counter()
+            cars = await asyncio.to_thread(database.query_listings, **arguments)
+            result = {
+                "success": True,
+                "cars_found": len(cars),
+                "query_ms": round((time.perf_counter() - start) * 1000, 2),
+                "data": cars
+            }
+        elif name == "get_listing":
+            result = await asyncio.to_thread(database.get_listing, arguments["item_id"])
+        elif name == "get_database_stats":
+            result = await asyncio.to_thread(database.get_stats)
+        else:
+            result = {"error": f"Unknown tool: {name}"}
+        return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False))]
+
+    except Exception as e:
+        return [TextContent(type="text", text=json.dumps({"error": str(e)}))]
+
+if __name__ == "__main__":
+    from mcp.server.stdio import stdio_server
+
+    async def main():
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+
+    asyncio.run(main())
@@ -1,8 +1,8 @@
-import requests
 from lxml import html
+from response_cache import cached_get
 
 def scrape_heftelser(url):
-    response = requests.get(url)
+    response = cached_get(url, "heftelser")
     tree = html.fromstring(response.content)
     
     # Sjekk om det finnes pant
@@ -0,0 +1,196 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+CACHE_DIR = os.getenv("CAR_FINDER_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024  # 100 MB of response bodies
+
+# How long a response is served without asking the origin again, per source (seconds)
+SOURCE_TTLS = {
+    "finn_search": 10 * 60,
+    "finn_item": 60 * 60,
+    "heftelser": 60 * 60,
+    "eu_kontroll": 6 * 60 * 60,
+}
+DEFAULT_TTL = 10 * 60
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+@dataclass
+class CachedResponse:
+    """A stored response body, exposing the parts of requests/httpx responses we use"""
+    url: str
+    status_code: int
+    content: bytes
+    encoding: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def raise_for_status(self):
+        # Only successful responses are ever stored
+        pass
+
+
+class ResponseCache:
+    """On-disk HTTP response cache with per-source TTLs and LRU eviction"""
+
+    def __init__(self, path: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "http_cache.sqlite")
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                source TEXT,
+                status_code INTEGER,
+                content BLOB,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL,
+                size INTEGER
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "stores": 0, "evictions": 0}
+
+    def lookup(self, url: str, source: str):
+        """Return (entry, is_fresh) for a URL, or (None, False) when it is not cached"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status_code, content, encoding, etag, last_modified, fetched_at "
+                "FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None, False
+            entry = CachedResponse(*row)
+            is_fresh = time.time() - entry.fetched_at < SOURCE_TTLS.get(source, DEFAULT_TTL)
+            if is_fresh:
+                self.stats["hits"] += 1
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+                self._conn.commit()
+            else:
+                self.stats["stale"] += 1
+            return entry, is_fresh
+
+    @staticmethod
+    def conditional_headers(entry: Optional[CachedResponse]) -> dict:
+        """Headers for revalidating a stale entry against the origin"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def mark_revalidated(self, entry: CachedResponse) -> CachedResponse:
+        """The origin answered 304 Not Modified: the stored body is fresh again"""
+        now = time.time()
+        with self._lock:
+            self.stats["revalidated"] += 1
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, entry.url)
+            )
+            self._conn.commit()
+        entry.fetched_at = now
+        return entry
+
+    def store(self, url: str, source: str, status_code: int, content: bytes, encoding: Optional[str],
+              etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a successful response and evict least recently used entries over the size bound"""
+        if status_code != 200:
+            return
+        now = time.time()
+        with self._lock:
+            self.stats["stores"] += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, source, status_code, content, encoding, etag, last_modified, now, now, len(content))
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self._conn.execute(
+            "SELECT url, size FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self.stats["evictions"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["stale"]
+        return {
+            **self.stats,
+            "entries": entries,
+            "bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache, shared by all fetchers"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def cached_get(url: str, source: str, headers: dict = None, timeout: float = 10):
+    """Blocking GET through the response cache, for the requests-based scrapers"""
+    cache = get_response_cache()
+    entry, is_fresh = cache.lookup(url, source)
+    if is_fresh:
+        return entry
+
+    request_headers = dict(HEADERS if headers is None else headers)
+    request_headers.update(cache.conditional_headers(entry))
+    response = requests.get(url, headers=request_headers, timeout=timeout)
+    if response.status_code == 304 and entry is not None:
+        return cache.mark_revalidated(entry)
+
+    cache.store(url, source, response.status_code, response.content, response.encoding,
+                response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return response
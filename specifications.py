@@ -0,0 +1,88 @@
+import re
+
+from vocabulary import get_specification_vocabularies
+
+# Fields of a normalized specification, with the type each value is stored as
+SPEC_FIELDS = {
+    "power_hp": int,
+    "fuel": str,
+    "gearbox": str,
+    "drivetrain": str,
+    "first_registration": str,  # ISO date, e.g. "2019-03-15"
+    "co2": int,  # g/km
+    "range_km": int,
+    "battery_kwh": float,
+    "reg_number": str,  # Upper case without spaces, e.g. "EK12345"
+}
+HP_PER_KW = 1.35962
+
+# Numbers as Finn writes them: "1 234", "77,4", "2.0"
+_NUMBER = r"\d+(?:[ \u00a0\u202f]\d{3})*(?:[.,]\d+)?"
+_NUMBER_RE = re.compile(_NUMBER)
+_POWER_RE = re.compile(rf"({_NUMBER})\s*(hk|hp|hestekrefter|kw)\b", re.IGNORECASE)
+_DATE_RE = re.compile(r"\b(\d{1,2})\.(\d{1,2})\.(\d{4})\b")
+_REG_NUMBER_RE = re.compile(r"\b([A-ZÆØÅ]{2})\s?(\d{4,5})\b", re.IGNORECASE)
+
+
+def parse_number(value: str):
+    """First number in a specification value as a float, None when there is none"""
+    match = _NUMBER_RE.search(value or "")
+    if match is None:
+        return None
+    return float(re.sub(r"[ \u00a0\u202f]", "", match.group()).replace(",", "."))
+
+
+def parse_power_hp(value: str):
+    """Horsepower from "218 hk" or "160 kW", preferring hk when both are given"""
+    matches = _POWER_RE.findall(value or "")
+    for number, unit in sorted(matches, key=lambda match: match[1].lower() == "kw"):
+        power = parse_number(number)
+        return round(power * HP_PER_KW) if unit.lower() == "kw" else round(power)
+    number = parse_number(value)
+    return round(number) if number is not None else None
+
+
+def parse_date(value: str):
+    """ISO date from a Norwegian "15.03.2019" date"""
+    match = _DATE_RE.search(value or "")
+    if match is None:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return None
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def parse_reg_number(value: str):
+    match = _REG_NUMBER_RE.search(value or "")
+    return (match.group(1) + match.group(2)).upper() if match else None
+
+
+def normalize_specifications(specifications: dict) -> dict:
+    """Map Finn's Norwegian specification labels to SPEC_FIELDS with parsed values
+
+    Labels must match a known variant exactly, so stray key/value pairs from
+    the page are left out. Fields without a label or an unparseable value are
+    None. When a field has several labels, the first parseable one wins.
+    """
+    labels, values = get_specification_vocabularies()
+    normalized = dict.fromkeys(SPEC_FIELDS)
+    for label, value in (specifications or {}).items():
+        field = labels.lookup(label)
+        if field is None or normalized[field] is not None or not isinstance(value, str):
+            continue
+        if field in values:
+            codes = values[field].codes_in(value)
+            parsed = codes[0] if codes else None
+        elif field == "power_hp":
+            parsed = parse_power_hp(value)
+        elif field == "first_registration":
+            parsed = parse_date(value)
+        elif field == "reg_number":
+            parsed = parse_reg_number(value)
+        else:
+            parsed = parse_number(value)
+            if parsed is not None:
+                parsed = SPEC_FIELDS[field](round(parsed, 1) if SPEC_FIELDS[field] is float else round(parsed))
+        normalized[field] = parsed
+    return normalized
@@ -4,6 +4,7 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from test_mcp_client import SimpleMCPClient
+from finn_search import FINN_MAX_PAGES
 
 st.set_page_config(
     page_title="🚗 Car Finder MCP",
@@ -55,6 +56,9 @@ if 'cars_data' not in st.session_state:
 if 'analysis_data' not in st.session_state:
     st.session_state.analysis_data = None
 
+if 'dataset_id' not in st.session_state:
+    st.session_state.dataset_id = None
+
 # Sidebar configuration
 st.sidebar.header("🔧 MCP Configuration")
 
@@ -80,6 +84,7 @@ finn_url = st.sidebar.text_input(
 )
 
 max_pages = st.sidebar.slider("📄 Max pages to scrape:", 1, 5, 1)
+fetch_all_pages = st.sidebar.checkbox("📚 Fetch all pages", value=False, help="Keep paging until the search has no more results")
 
 analysis_type = st.sidebar.selectbox(
     "📊 Analysis type:",
@@ -87,6 +92,30 @@ analysis_type = st.sidebar.selectbox(
     index=1
 )
 
+async def stream_scraper_results(url, pages, preview, auto_paginate=False):
+    """Collect streamed pages from the web scraper, previewing the rows found so far
+
+    Pages arrive in the order they finish; the cars are kept in page order, so the
+    same scrape always gives the same table and dataset id.
+    """
+    page_cars = {}
+    cars = []
+    try:
+        async for page_result in st.session_state.mcp_client.stream_web_scraper("fetch_finn_data", {
+            "url": url,
+            "max_pages": pages,
+            "auto_paginate": auto_paginate
+        }):
+            page_cars[page_result["page"]] = page_result["data"]
+            cars = [car for page in sorted(page_cars) for car in page_cars[page]]
+            preview_columns = [col for col in ['name', 'year', 'price', 'mileage', 'km_per_year'] if cars and col in cars[0]]
+            preview.dataframe(pd.DataFrame(cars)[preview_columns], use_container_width=True, hide_index=True)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        preview.empty()
+    return {"success": True, "cars_found": len(cars), "data": cars}
+
 # Fetch data button
 if st.sidebar.button("🚀 Fetch & Analyze Data", type="primary", use_container_width=True):
     if finn_url:
@@ -96,23 +125,28 @@ if st.sidebar.button("🚀 Fetch & Analyze Data", type="primary", use_container_
                 loop = asyncio.new_event_loop()
                 asyncio.set_event_loop(loop)
                 
-                # Fetch data using MCP
+                # Fetch data using MCP, rendering each page as soon as it arrives
                 scraper_result = loop.run_until_complete(
-                    st.session_state.mcp_client.call_web_scraper("fetch_finn_data", {
-                        "url": finn_url,
-                        "max_pages": max_pages
-                    })
+                    stream_scraper_results(finn_url, FINN_MAX_PAGES if fetch_all_pages else max_pages, st.empty(), fetch_all_pages)
                 )
                 
                 if scraper_result.get("success"):
                     st.session_state.cars_data = scraper_result["data"]
                     st.sidebar.success(f"✅ Found {scraper_result['cars_found']} cars!")
                     
+                    # Send the cars to the analyzer once, later calls only pass the dataset id
+                    register_result = loop.run_until_complete(
+                        st.session_state.mcp_client.call_data_analyzer("register_dataset", {
+                            "cars_data": st.session_state.cars_data
+                        })
+                    )
+                    st.session_state.dataset_id = register_result.get("dataset_id")
+                    
                     # Analyze data using MCP
                     with st.spinner("📊 MCP Data Analyzer is processing..."):
                         analysis_result = loop.run_until_complete(
                             st.session_state.mcp_client.call_data_analyzer("analyze_car_market", {
-                                "cars_data": st.session_state.cars_data,
+                                "dataset_id": st.session_state.dataset_id,
                                 "analysis_type": analysis_type
                             })
                         )
@@ -251,7 +285,7 @@ if st.session_state.cars_data and st.session_state.analysis_data:
                 
                 deals_result = loop.run_until_complete(
                     st.session_state.mcp_client.call_data_analyzer("find_best_deals", {
-                        "cars_data": st.session_state.cars_data,
+                        "dataset_id": st.session_state.dataset_id,
                         "max_price": max_price_filter,
                         "max_mileage": max_mileage_filter,
                         "min_year": min_year_filter
@@ -268,6 +302,12 @@ if st.session_state.cars_data and st.session_state.analysis_data:
                         st.markdown("### 🏆 Top Best Deals")
                         
                         for i, deal in enumerate(deals, 1):
+                            discount = deal.get('discount_vs_market')
+                            market_line = ""
+                            if discount is not None:
+                                market_line = f"<br>🏷️ {abs(discount):.0%} {'under' if discount >= 0 else 'over'} fair price ({deal['fair_price']:,.0f} kr)"
+                                if deal.get('price_outlier'):
+                                    market_line += " ⚠️ unusual price"
                             with st.container():
                                 st.markdown(f"""
                                 <div class="deal-card">
@@ -276,7 +316,7 @@ if st.session_state.cars_data and st.session_state.analysis_data:
                                     <div>
                                         <strong>💰 {deal['price']:,.0f} kr</strong><br>
                                         📏 {deal['mileage']:,.0f} km | 🏃 {deal['km_per_year']:,.0f} km/year<br>
-                                        📊 Value Score: <strong>{deal['value_score']}</strong>
+                                        📊 Value Score: <strong>{deal['value_score']}</strong>{market_line}
                                     </div>
                                     <div>
                                         <a href="{deal['link']}" target="_blank" style="text-decoration: none;">
@@ -298,6 +338,60 @@ if st.session_state.cars_data and st.session_state.analysis_data:
             finally:
                 loop.close()
     
+    # Depreciation for the whole result set in one call
+    st.header("📉 Predict Depreciation")
+
+    col1, col2 = st.columns([3, 1])
+
+    with col1:
+        years_ahead = st.slider("📅 Years ahead", min_value=1, max_value=10, value=3)
+
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)  # Spacing
+        depreciation_btn = st.button("📈 Predict Depreciation", type="secondary", use_container_width=True)
+
+    if depreciation_btn:
+        with st.spinner("📉 MCP Data Analyzer is predicting values..."):
+            try:
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+
+                depreciation_result = loop.run_until_complete(
+                    st.session_state.mcp_client.call_data_analyzer("predict_depreciation_batch", {
+                        "dataset_id": st.session_state.dataset_id,
+                        "years_ahead": years_ahead
+                    })
+                )
+
+                if depreciation_result.get("success"):
+                    depreciation_df = pd.DataFrame(depreciation_result["rows"], columns=depreciation_result["columns"])
+                    year_columns = [f"year_{year}" for year in depreciation_result["years"]]
+
+                    if not depreciation_df.empty:
+                        # Average share of today's price kept, per year
+                        retained = depreciation_df[year_columns].div(depreciation_df["current_price"], axis=0).mean() * 100
+                        fig_depreciation = px.line(
+                            x=depreciation_result["years"],
+                            y=retained.values,
+                            markers=True,
+                            title="📉 Average Value Retained",
+                            labels={'x': 'Years Ahead', 'y': 'Value Retained (%)'}
+                        )
+                        st.plotly_chart(fig_depreciation, use_container_width=True)
+                        st.dataframe(depreciation_df.drop(columns=["id", "link"]), use_container_width=True)
+
+                    for description in depreciation_result["curves"].values():
+                        st.caption(f"📐 {description}")
+                    if depreciation_result["skipped"]:
+                        st.caption(f"⏭️ {depreciation_result['skipped']} sold or unpriced cars skipped")
+                else:
+                    st.error(f"❌ Depreciation error: {depreciation_result.get('error')}")
+
+            except Exception as e:
+                st.error(f"❌ Error: {str(e)}")
+            finally:
+                loop.close()
+
     # Raw data table
     st.header("📋 All Cars Data")
     
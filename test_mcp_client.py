@@ -1,7 +1,14 @@
 import asyncio
 import json
-from test_webscraper import test_fetch_finn_data
+from test_webscraper import test_fetch_finn_data, test_stream_finn_data
+from finn_search import FINN_MAX_PAGES
 from test_data_analysis import test_analyze_car_market
+from market_analysis import analysis_cache, get_market_stats
+from dataset_registry import register_dataset, resolve_cars
+from depreciation import depreciation_table
+from comparables import find_comparables, DEFAULT_K
+from fair_price import get_fair_price_model
+from value_scoring import select_best_deals, get_scoring_profile, DEFAULT_TOP_K
 
 class SimpleMCPClient:
     """Simple MCP client for testing without full protocol"""
@@ -9,62 +16,92 @@ class SimpleMCPClient:
     async def call_web_scraper(self, tool_name: str, arguments: dict):
         """Simulate calling web scraper MCP server"""
         if tool_name == "fetch_finn_data":
+            auto_paginate = arguments.get("auto_paginate", False)
             return await test_fetch_finn_data(
                 arguments["url"], 
-                arguments.get("max_pages", 1)
+                arguments.get("max_pages", FINN_MAX_PAGES if auto_paginate else 1),
+                auto_paginate=auto_paginate
             )
         else:
             return {"error": f"Unknown tool: {tool_name}"}
     
+    async def stream_web_scraper(self, tool_name: str, arguments: dict):
+        """Simulate a streaming web scraper call: yields one result per parsed page"""
+        if tool_name != "fetch_finn_data":
+            raise ValueError(f"Unknown streaming tool: {tool_name}")
+        auto_paginate = arguments.get("auto_paginate", False)
+        async for page_result in test_stream_finn_data(
+            arguments["url"],
+            arguments.get("max_pages", FINN_MAX_PAGES if auto_paginate else 1),
+            auto_paginate=auto_paginate
+        ):
+            yield page_result
+    
     async def call_data_analyzer(self, tool_name: str, arguments: dict):
         """Simulate calling data analyzer MCP server"""
         if tool_name == "analyze_car_market":
             return await test_analyze_car_market(
-                arguments["cars_data"],
-                arguments.get("analysis_type", "basic")
+                arguments.get("cars_data"),
+                arguments.get("analysis_type", "basic"),
+                arguments.get("dataset_id")
             )
         elif tool_name == "find_best_deals":
             return await test_find_best_deals(arguments)
+        elif tool_name == "register_dataset":
+            return {"success": True, "dataset_id": register_dataset(arguments["cars_data"]), "cars": len(arguments["cars_data"])}
+        elif tool_name == "update_market_stats":
+            stats = get_market_stats(arguments["market_key"], arguments.get("reset", False))
+            if arguments.get("changes"):
+                stats.apply_changes(arguments["changes"])
+            stats.add(arguments.get("cars_data") or [])
+            stats.remove(arguments.get("removed") or [])
+            return {"success": True, "market_key": arguments["market_key"], **stats.analysis(arguments.get("analysis_type", "basic"))}
+        elif tool_name == "find_comparable_cars":
+            try:
+                return {"success": True, **find_comparables(arguments.get("car_data"), arguments.get("item_id"), arguments.get("k", DEFAULT_K))}
+            except Exception as e:
+                return {"success": False, "error": str(e)}
+        elif tool_name == "predict_depreciation_batch":
+            try:
+                return {"success": True, **depreciation_table(resolve_cars(arguments), arguments.get("years_ahead", 3))}
+            except Exception as e:
+                return {"success": False, "error": str(e)}
+        elif tool_name == "get_analysis_cache_stats":
+            return analysis_cache.get_stats()
         else:
             return {"error": f"Unknown tool: {tool_name}"}
 
 async def test_find_best_deals(arguments: dict):
     """Test version of find_best_deals"""
     try:
-        cars_data = arguments["cars_data"]
+        cars_data = resolve_cars(arguments)
         max_price = arguments.get("max_price")
         max_mileage = arguments.get("max_mileage")  
         min_year = arguments.get("min_year")
+        profile = get_scoring_profile(arguments.get("scoring_profile"))
+        top_k = arguments.get("top_k", DEFAULT_TOP_K)
         
-        import pandas as pd
-        df = pd.DataFrame(cars_data)
-        
-        # Filter available cars
-        filtered_cars = df[df['price'] != 'Solgt'].copy()
-        filtered_cars['price'] = pd.to_numeric(filtered_cars['price'], errors='coerce')
+        # Filter, score and rank chunk by chunk, keeping only the top_k cars in memory;
+        # ties on value score go to the car priced furthest below comparable listings
+        fair_price_model = None
+        if arguments.get("use_fair_price", True):
+            # Refreshing the model reads the database and saves it to disk
+            fair_price_model = await asyncio.to_thread(get_fair_price_model)
+        best_deals, total_matches = select_best_deals(
+            cars_data, max_price, max_mileage, min_year, profile, top_k, fair_price_model=fair_price_model
+        )
         
-        # Apply filters
-        if max_price:
-            filtered_cars = filtered_cars[filtered_cars['price'] <= max_price]
-        if max_mileage:
-            filtered_cars = filtered_cars[filtered_cars['mileage'] <= max_mileage]
-        if min_year:
-            filtered_cars = filtered_cars[filtered_cars['year'] >= min_year]
-            
-        # Calculate value scores
-        if not filtered_cars.empty:
-            filtered_cars['value_score'] = calculate_value_score(filtered_cars)
-            best_deals = filtered_cars.nlargest(5, 'value_score')
-            
+        if total_matches:
             result = {
                 "success": True,
-                "best_deals": best_deals.to_dict('records'),
+                "best_deals": best_deals,
                 "criteria_applied": {
                     "max_price": max_price,
                     "max_mileage": max_mileage,
-                    "min_year": min_year
+                    "min_year": min_year,
+                    "scoring_profile": profile.to_dict()
                 },
-                "total_matches": len(filtered_cars)
+                "total_matches": total_matches
             }
         else:
             result = {"success": True, "best_deals": [], "message": "No cars match the criteria"}
@@ -74,44 +111,6 @@ async def test_find_best_deals(arguments: dict):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def calculate_value_score(df):
-    """Calculate value score for cars"""
-    scores = []
-    for _, car in df.iterrows():
-        score = 0
-        
-        # Lower km/year is better
-        if car.get('km_per_year'):
-            if car['km_per_year'] < 15000:
-                score += 3
-            elif car['km_per_year'] < 20000:
-                score += 2
-            else:
-                score += 1
-                
-        # Newer cars get higher scores
-        if car.get('age'):
-            if car['age'] < 3:
-                score += 3
-            elif car['age'] < 5:
-                score += 2
-            else:
-                score += 1
-                
-        # Price efficiency (lower price per km is better)
-        if car.get('price') and car.get('mileage') and car['mileage'] > 0:
-            price_per_km = car['price'] / car['mileage']
-            if price_per_km < 2:
-                score += 3
-            elif price_per_km < 3:
-                score += 2
-            else:
-                score += 1
-                
-        scores.append(score)
-    
-    return scores
-
 # Test the complete workflow
 async def test_complete_workflow():
     client = SimpleMCPClient()
@@ -130,7 +129,7 @@ async def test_complete_workflow():
         
         print("\n📊 Testing data analyzer...")
         analysis_result = await client.call_data_analyzer("analyze_car_market", {
-            "cars_data": scraper_result["data"],
+            "dataset_id": scraper_result["dataset_id"],
             "analysis_type": "detailed"
         })
         
@@ -160,7 +159,7 @@ async def test_complete_workflow():
             # Test best deals finder
             print("\n🎯 Finding best deals...")
             best_deals_result = await client.call_data_analyzer("find_best_deals", {
-                "cars_data": scraper_result["data"],
+                "dataset_id": scraper_result["dataset_id"],
                 "max_price": 360000,  # Increased from 350000
                 "max_mileage": 150000,  # Increased from 80000
                 "min_year": 2019  # Lowered from 2020
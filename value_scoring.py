@@ -0,0 +1,222 @@
+import heapq
+from dataclasses import dataclass, asdict, fields
+
+import numpy as np
+import pandas as pd
+
+from car_records import CarRecordBatch
+
+
+@dataclass
+class ScoringProfile:
+    """Thresholds and weights for the value score
+
+    Each criterion is scored by the band its value falls in: below the first
+    threshold earns band_points[0], below the second band_points[1], and so on.
+    """
+    km_per_year_thresholds: tuple = (15000, 20000)
+    age_thresholds: tuple = (3, 5)
+    price_per_km_thresholds: tuple = (2, 3)
+    band_points: tuple = (3, 2, 1)
+    km_per_year_weight: float = 1
+    age_weight: float = 1
+    price_per_km_weight: float = 1
+
+    def __post_init__(self):
+        for name in ('km_per_year_thresholds', 'age_thresholds', 'price_per_km_thresholds', 'band_points'):
+            setattr(self, name, tuple(getattr(self, name)))
+        for name in ('km_per_year_thresholds', 'age_thresholds', 'price_per_km_thresholds'):
+            thresholds = getattr(self, name)
+            if list(thresholds) != sorted(thresholds):
+                raise ValueError(f"{name} must be in increasing order")
+            if len(self.band_points) != len(thresholds) + 1:
+                raise ValueError(f"band_points needs {len(thresholds) + 1} values to match {name}")
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        known = {field.name for field in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown scoring profile fields: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+# Ready-made profiles for common buyers; the default reproduces the original scoring
+SCORING_PROFILES = {
+    "default": ScoringProfile(),
+    "low_mileage": ScoringProfile(km_per_year_thresholds=(10000, 15000), km_per_year_weight=2),
+    "budget": ScoringProfile(price_per_km_thresholds=(1.5, 2.5), price_per_km_weight=2),
+    "newest": ScoringProfile(age_thresholds=(2, 4), age_weight=2),
+}
+
+
+def get_scoring_profile(profile=None) -> ScoringProfile:
+    """Resolve a profile given by name, as a dict of overrides, or as a ScoringProfile"""
+    if profile is None:
+        return SCORING_PROFILES["default"]
+    if isinstance(profile, ScoringProfile):
+        return profile
+    if isinstance(profile, str):
+        if profile not in SCORING_PROFILES:
+            raise ValueError(f"Unknown scoring profile '{profile}', expected one of {', '.join(SCORING_PROFILES)}")
+        return SCORING_PROFILES[profile]
+    return ScoringProfile.from_dict(profile)
+
+
+def _truthy(df, column):
+    """Row-wise truthiness as the old row loop saw it: NaN counts as set, None and 0 do not"""
+    if column not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return df[column].to_numpy().astype(bool)
+
+
+def _numeric(df, column):
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def _band_points(values, thresholds, band_points):
+    # NaN sorts past every threshold, landing in the last band like the old else-branch
+    return np.asarray(band_points)[np.searchsorted(thresholds, values, side='right')]
+
+
+def calculate_value_score(df, profile=None):
+    """Calculate value score for cars"""
+    profile = get_scoring_profile(profile)
+    km_per_year = _numeric(df, 'km_per_year')
+    age = _numeric(df, 'age')
+    price = _numeric(df, 'price')
+    mileage = _numeric(df, 'mileage')
+
+    # Lower km/year is better
+    scores = np.where(
+        _truthy(df, 'km_per_year'),
+        profile.km_per_year_weight * _band_points(km_per_year, profile.km_per_year_thresholds, profile.band_points),
+        0
+    )
+
+    # Newer cars get higher scores
+    scores = scores + np.where(
+        _truthy(df, 'age'),
+        profile.age_weight * _band_points(age, profile.age_thresholds, profile.band_points),
+        0
+    )
+
+    # Price efficiency (lower price per km is better)
+    has_price_per_km = _truthy(df, 'price') & _truthy(df, 'mileage') & (mileage > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_per_km = price / mileage
+    scores = scores + np.where(
+        has_price_per_km,
+        profile.price_per_km_weight * _band_points(price_per_km, profile.price_per_km_thresholds, profile.band_points),
+        0
+    )
+    return scores
+
+
+DEFAULT_TOP_K = 5
+DEFAULT_CHUNK_SIZE = 2000
+NUMERIC_COLUMNS = ('km_per_year', 'age', 'mileage', 'year')
+
+
+def _filter_available(chunk, max_price=None, max_mileage=None, min_year=None):
+    """Drop sold cars and apply the find_best_deals criteria to one chunk"""
+    chunk = chunk[chunk['price'] != 'Solgt'].copy()
+    chunk['price'] = pd.to_numeric(chunk['price'], errors='coerce')
+    if max_price:
+        chunk = chunk[chunk['price'] <= max_price]
+    if max_mileage:
+        chunk = chunk[chunk['mileage'] <= max_mileage]
+    if min_year:
+        chunk = chunk[chunk['year'] >= min_year]
+    return chunk
+
+
+def _car_chunks(cars_data, chunk_size):
+    """DataFrames of chunk_size cars, typed the way one DataFrame of all cars would be"""
+    if isinstance(cars_data, CarRecordBatch):
+        # Typed columns already; sold cars are dropped here instead of by their "Solgt" price
+        empty_columns = [column for column in NUMERIC_COLUMNS if not cars_data.has_values(column)]
+        for start in range(0, len(cars_data), chunk_size):
+            chunk = cars_data.slice(start, start + chunk_size).to_pandas()
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            chunk = chunk[~chunk.pop('sold')]
+            for column in empty_columns:
+                chunk[column] = None
+            yield chunk
+        return
+
+    # Columns that hold any value are numeric for the whole pool, so a chunk that
+    # only has None (or nothing) there must still see NaN like one big DataFrame would
+    numeric_columns = [
+        column for column in NUMERIC_COLUMNS
+        if any(car.get(column) is not None for car in cars_data)
+    ]
+    has_price = any('price' in car for car in cars_data)
+    for start in range(0, len(cars_data), chunk_size):
+        chunk = pd.DataFrame(cars_data[start:start + chunk_size])
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        for column in numeric_columns:
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce') if column in chunk else np.nan
+        if has_price and 'price' not in chunk:
+            chunk['price'] = np.nan
+        yield chunk
+
+
+def select_best_deals(cars_data, max_price=None, max_mileage=None, min_year=None,
+                      profile=None, top_k: int = DEFAULT_TOP_K, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                      fair_price_model=None):
+    """Filter, score and keep the top_k cars chunk by chunk, returning (best_deals, total_matches)
+
+    cars_data is a list of car dicts or a CarRecordBatch.
+
+    Only one chunk is materialised as a DataFrame at a time and a heap holds at
+    most top_k cars, so memory is O(chunk_size + top_k) however many cars come in.
+    With a fair_price_model each deal also gets fair_price, discount_vs_market
+    and price_outlier. Deals rank by value_score, then discount_vs_market (cars
+    without a fair price last), then input position, and come back best first
+    with their value_score.
+    """
+    profile = get_scoring_profile(profile)
+    heap = []
+    columns = {}
+    total_matches = 0
+    for chunk in _car_chunks(cars_data, chunk_size):
+        columns.update(dict.fromkeys(chunk.columns))
+        chunk = _filter_available(chunk, max_price, max_mileage, min_year)
+        total_matches += len(chunk)
+        if chunk.empty:
+            continue
+
+        chunk['value_score'] = calculate_value_score(chunk, profile)
+        if fair_price_model is not None:
+            chunk['fair_price'], chunk['discount_vs_market'], chunk['price_outlier'] = \
+                fair_price_model.price_signals(chunk)
+            discount = np.nan_to_num(chunk['discount_vs_market'].to_numpy(), nan=-np.inf)
+        else:
+            discount = np.zeros(len(chunk))
+        # Only a chunk's own top_k can make it into the overall top_k
+        order = np.lexsort((chunk.index.to_numpy(), -discount, -chunk['value_score'].to_numpy()))[:top_k]
+        candidates = chunk.iloc[order]
+        for position, rank, car in zip(candidates.index, discount[order], candidates.to_dict('records')):
+            entry = (car['value_score'], rank, -position)
+            if len(heap) < top_k:
+                heapq.heappush(heap, (entry, car))
+            elif entry > heap[0][0]:
+                heapq.heapreplace(heap, (entry, car))
+
+    best = [car for _, car in sorted(heap, key=lambda item: item[0], reverse=True)]
+    if not best:
+        return [], total_matches
+    # Same record layout as to_dict('records') on the whole filtered pool
+    signals = ['fair_price', 'discount_vs_market', 'price_outlier'] if fair_price_model is not None else []
+    best_deals = pd.DataFrame(best, columns=[*columns, 'value_score', *signals])
+    if signals:
+        best_deals['fair_price'] = best_deals['fair_price'].round()
+        best_deals['discount_vs_market'] = best_deals['discount_vs_market'].round(3)
+        best_deals[signals] = best_deals[signals].astype(object).where(best_deals[signals].notna(), None)
+    return best_deals.to_dict('records'), total_matches
@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import threading
+
+# Point CAR_FINDER_VOCABULARY at another JSON file to change the vocabulary without code changes
+VOCABULARY_PATH = os.getenv(
+    "CAR_FINDER_VOCABULARY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "car_vocabulary.json")
+)
+
+# Punctuation that never belongs to an equipment name; '-', '+', '/' and '&' do ("DAB+", "A/C")
+_SEPARATOR_RE = re.compile(r"[\s.,;:()!?\"'*•·]+")
+
+
+def normalize_phrase(text: str) -> str:
+    """Lowercase text with punctuation and repeated whitespace collapsed to single spaces"""
+    return _SEPARATOR_RE.sub(" ", (text or "").lower()).strip()
+
+
+def load_vocabulary(path: str = VOCABULARY_PATH) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class KeywordMatcher:
+    """A keyword list compiled into one alternation, so a text is scanned once for all of them
+
+    Longer keywords come first, so where two keywords start at the same
+    place ("elektriske", "elektrisk") the longer one is reported.
+    """
+
+    def __init__(self, keywords: list):
+        self.keywords = {keyword.lower(): keyword for keyword in keywords}
+        self.alternation = "|".join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True))
+        self.pattern = re.compile(self.alternation, re.IGNORECASE)
+
+    def keyword(self, matched_text: str) -> str:
+        """The vocabulary keyword for a matched piece of text"""
+        return self.keywords[matched_text.lower()]
+
+
+class PhraseVocabulary:
+    """Maps variants ("Klimaanlegg", "Aircondition", "A/C") to one canonical code
+
+    Items are matched phrase by phrase, longest alias first, so "Adaptiv
+    cruisekontroll" gives adaptive_cruise_control and not cruise_control.
+    Lookup cost is O(words x longest alias) per item, whatever the vocabulary size.
+    """
+
+    def __init__(self, equipment: dict):
+        self.aliases = {}
+        for code, variants in equipment.items():
+            for variant in [code.replace("_", " "), *variants]:
+                self.aliases.setdefault(normalize_phrase(variant), code)
+        self.max_words = max((len(alias.split()) for alias in self.aliases), default=1)
+
+    def lookup(self, text: str):
+        """Code for a whole phrase, None when it is not a known variant"""
+        return self.aliases.get(normalize_phrase(text))
+
+    def codes_in(self, text: str) -> list:
+        """Canonical codes mentioned in one item, in order of appearance"""
+        words = normalize_phrase(text).split()
+        codes = []
+        position = 0
+        while position < len(words):
+            for size in range(min(self.max_words, len(words) - position), 0, -1):
+                code = self.aliases.get(" ".join(words[position:position + size]))
+                if code is not None:
+                    codes.append(code)
+                    position += size
+                    break
+            else:
+                position += 1
+        return codes
+
+    def canonicalize(self, items: list) -> list:
+        """Distinct canonical codes for a list of items, first mention first"""
+        codes = {}  # Ordered set
+        for item in items:
+            for code in self.codes_in(item):
+                codes[code] = None
+        return list(codes)
+
+
+_vocabulary = None
+_equipment_vocabulary = None
+_keyword_matchers = {}
+_spec_vocabularies = None
+_vocabulary_lock = threading.Lock()
+
+
+def get_vocabulary() -> dict:
+    """The vocabulary file, read once per process"""
+    global _vocabulary
+    with _vocabulary_lock:
+        if _vocabulary is None:
+            _vocabulary = load_vocabulary()
+        return _vocabulary
+
+
+def get_equipment_vocabulary() -> PhraseVocabulary:
+    """Return the equipment vocabulary loaded from car_vocabulary.json"""
+    global _equipment_vocabulary
+    vocabulary = get_vocabulary()
+    with _vocabulary_lock:
+        if _equipment_vocabulary is None:
+            _equipment_vocabulary = PhraseVocabulary(vocabulary["equipment"])
+        return _equipment_vocabulary
+
+
+def get_keyword_matcher(name: str) -> KeywordMatcher:
+    """Matcher for a keyword list in the vocabulary, e.g. 'specification_keywords'"""
+    vocabulary = get_vocabulary()
+    with _vocabulary_lock:
+        if name not in _keyword_matchers:
+            _keyword_matchers[name] = KeywordMatcher(vocabulary[name])
+        return _keyword_matchers[name]
+
+
+def get_specification_vocabularies() -> tuple:
+    """(labels, values) for the specification schema
+
+    labels maps a Finn specification label ("Effekt", "1. gang registrert") to
+    its schema field, values holds a PhraseVocabulary per field with fixed
+    codes, e.g. values["fuel"] maps "Bensin" to "petrol".
+    """
+    global _spec_vocabularies
+    vocabulary = get_vocabulary()
+    with _vocabulary_lock:
+        if _spec_vocabularies is None:
+            _spec_vocabularies = (
+                PhraseVocabulary(vocabulary["specification_labels"]),
+                {field: PhraseVocabulary(codes) for field, codes in vocabulary["specification_values"].items()}
+            )
+        return _spec_vocabularies
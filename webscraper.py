@@ -1,14 +1,24 @@
 import asyncio
 import json
+import httpx
 from mcp.server import Server
 from mcp.types import Tool, TextContent
 from lxml import html
-import requests
-from bs4 import BeautifulSoup
-import re
+from http_fetcher import get_fetcher
+from response_cache import get_response_cache
+from listing_parser import PARSER_BACKENDS, DEFAULT_BACKEND
+from detail_parser import parse_car_details
+from finn_search import iter_search_pages, iter_all_search_pages, FINN_MAX_PAGES
+from listing_state import get_listing_state, search_key
+from car_records import CarRecordBatch
+from dataset_registry import register_dataset
+from enrichment_store import get_enrichment_store, SOURCE_MAX_AGE
+from mcp_servers.car_database import get_car_database
 
 app = Server("web_scraper")
 
+DEFAULT_DETAIL_WORKERS = 5  # Listings enriched in parallel by extract_car_details_batch
+
 @app.list_tools()
 async def list_tools():
     return [
@@ -19,7 +29,11 @@ async def list_tools():
                 "type": "object",
                 "properties": {
                     "url": {"type": "string", "description": "Finn.no search URL"},
-                    "max_pages": {"type": "integer", "default": 1, "description": "Maximum pages to scrape"}
+                    "max_pages": {"type": "integer", "default": 1, "description": "Maximum pages to scrape"},
+                    "parser": {"type": "string", "enum": list(PARSER_BACKENDS), "default": DEFAULT_BACKEND, "description": "Search page parser backend"},
+                    "stream": {"type": "boolean", "default": False, "description": "Emit each page's cars as NDJSON / progress notifications as soon as it is parsed"},
+                    "auto_paginate": {"type": "boolean", "default": False, "description": "Fetch every result page until the search is exhausted (max_pages becomes an upper bound)"},
+                    "include_data": {"type": "boolean", "default": True, "description": "Return the cars themselves; set to false to only get the dataset_id for the analysis tools"}
                 },
                 "required": ["url"]
             }
@@ -34,6 +48,50 @@ async def list_tools():
                 },
                 "required": ["car_url"]
             }
+        ),
+        Tool(
+            name="extract_car_details_batch",
+            description="Extract detailed information from many car listings concurrently",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "car_urls": {"type": "array", "items": {"type": "string"}, "description": "Direct URLs to car listings"},
+                    "max_workers": {"type": "integer", "default": DEFAULT_DETAIL_WORKERS, "description": "Maximum listings processed in parallel"}
+                },
+                "required": ["car_urls"]
+            }
+        ),
+        Tool(
+            name="fetch_finn_changes",
+            description="Re-scrape a saved Finn.no search and report only new, removed, price-changed and sold listings since the last run",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "url": {"type": "string", "description": "Finn.no search URL"},
+                    "max_pages": {"type": "integer", "default": FINN_MAX_PAGES, "description": "Maximum pages to scrape"},
+                    "parser": {"type": "string", "enum": list(PARSER_BACKENDS), "default": DEFAULT_BACKEND, "description": "Search page parser backend"},
+                    "fetch_details": {"type": "boolean", "default": True, "description": "Extract details for new and changed listings only"},
+                    "max_workers": {"type": "integer", "default": DEFAULT_DETAIL_WORKERS, "description": "Maximum listings processed in parallel"}
+                },
+                "required": ["url"]
+            }
+        ),
+        Tool(
+            name="lookup_enrichment",
+            description="Look up stored heftelser and EU-kontroll results for many registration numbers at once, without network calls",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "registration_numbers": {"type": "array", "items": {"type": "string"}},
+                    "sources": {"type": "array", "items": {"type": "string", "enum": list(SOURCE_MAX_AGE)}, "description": "Sources to look up, all by default"}
+                },
+                "required": ["registration_numbers"]
+            }
+        ),
+        Tool(
+            name="get_cache_stats",
+            description="Show hit/miss counters and size of the shared HTTP response cache",
+            inputSchema={"type": "object", "properties": {}}
         )
     ]
 
@@ -41,38 +99,58 @@ async def list_tools():
 @app.call_tool()
 async def call_tool(name: str, arguments: dict):
     if name == "fetch_finn_data":
-        return await fetch_finn_data(arguments["url"], arguments.get("max_pages", 1))
+        auto_paginate = arguments.get("auto_paginate", False)
+        return await fetch_finn_data(
+            arguments["url"], arguments.get("max_pages", FINN_MAX_PAGES if auto_paginate else 1),
+            arguments.get("parser", DEFAULT_BACKEND), arguments.get("stream", False), auto_paginate,
+            arguments.get("include_data", True)
+        )
     elif name == "extract_car_details":
         return await extract_car_details(arguments["car_url"])
+    elif name == "extract_car_details_batch":
+        return await extract_car_details_batch(
+            arguments["car_urls"], arguments.get("max_workers", DEFAULT_DETAIL_WORKERS)
+        )
+    elif name == "fetch_finn_changes":
+        return await fetch_finn_changes(
+            arguments["url"], arguments.get("max_pages", FINN_MAX_PAGES),
+            arguments.get("parser", DEFAULT_BACKEND), arguments.get("fetch_details", True),
+            arguments.get("max_workers", DEFAULT_DETAIL_WORKERS)
+        )
+    elif name == "lookup_enrichment":
+        return await lookup_enrichment(arguments["registration_numbers"], arguments.get("sources"))
+    elif name == "get_cache_stats":
+        return [TextContent(type="text", text=json.dumps(get_response_cache().get_stats()))]
 
 
 # This function fetches car data from Finn.no and parses it
-async def fetch_finn_data(url: str, max_pages: int = 1):
+async def fetch_finn_data(url: str, max_pages: int = 1, parser: str = DEFAULT_BACKEND,
+                          stream: bool = False, auto_paginate: bool = False, include_data: bool = True):
     """Enhanced version of your parse_car_data function"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+        if stream:
+            return await stream_finn_data(url, max_pages, parser, auto_paginate)
         
-        all_cars = []
-        current_year = 2025
+        # All pages are requested concurrently, results are put back in page order
+        pages = {}
+        async for page, cars in search_pages(url, max_pages, parser, auto_paginate):
+            pages[page] = cars
+        all_cars = [car for page in sorted(pages) for car in pages[page]]
+        # The fair price, comparables and depreciation models read listings from the car database
+        await asyncio.to_thread(get_car_database().upsert_listings, all_cars)
         
-        for page in range(max_pages):
-            page_url = f"{url}&page={page + 1}" if page > 0 else url
-            response = requests.get(page_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'lxml')
-            cars = parse_page_cars(soup, current_year)
-            all_cars.extend(cars)
+        # Analysis tools can refer to the scrape by id instead of receiving it again
+        result = {
+            "success": True,
+            "cars_found": len(all_cars),
+            "dataset_id": await asyncio.to_thread(register_dataset, all_cars)
+        }
+        if include_data:
+            result["data"] = all_cars
             
         return [TextContent(
             type="text",
-            text=json.dumps({
-                "success": True,
-                "cars_found": len(all_cars),
-                "data": all_cars
-            }, ensure_ascii=False)
+            text=json.dumps(result, ensure_ascii=False)
         )]
         
     except Exception as e:
@@ -81,193 +159,131 @@ async def fetch_finn_data(url: str, max_pages: int = 1):
             text=json.dumps({"success": False, "error": str(e)})
         )]
 
-def parse_page_cars(soup, current_year):
-    """Your existing parsing logic from main.py"""
-    parsed_cars_list = []
-    successful_car_id_counter = 0
-
-    # Find the main tag with a class that starts with "page-container"
-    main_element = soup.find('main', class_=re.compile(r"page-container"))
-    if not main_element:
-        return []
+def search_pages(url: str, max_pages: int, parser: str, auto_paginate: bool):
+    """Page iterator for a search: a fixed number of pages or until the results run out"""
+    if auto_paginate:
+        return iter_all_search_pages(url, parser, max_pages)
+    return iter_search_pages(url, max_pages, parser)
 
-    # CSS selector to navigate to the container of car listings
-    ads_container_selector = 'div:nth-of-type(1) > div:nth-of-type(2) > section > div:nth-of-type(3)'
-    ads_container = main_element.select_one(ads_container_selector)
-    if not ads_container:
-        return []
+async def stream_finn_data(url: str, max_pages: int = 1, parser: str = DEFAULT_BACKEND, auto_paginate: bool = False):
+    """Emit each page's cars as soon as the page is parsed
 
-    # Get all direct div children of ads_container
-    car_item_wrapper_divs = ads_container.find_all('div', recursive=False)
-    if not car_item_wrapper_divs:
-        return []
+    Every page goes out as one NDJSON line in an MCP progress notification.
+    Clients that did not ask for progress get all lines in the result instead;
+    otherwise the result only summarises, so memory stays bounded by one page
+    (plus its compact columnar copy, registered as a dataset at the end).
+    """
+    lines = []
+    page_batches = {}
+    pages_done = 0
+    cars_found = 0
+    async for page, cars in search_pages(url, max_pages, parser, auto_paginate):
+        pages_done += 1
+        cars_found += len(cars)
+        page_batches[page] = CarRecordBatch.from_cars(cars)
+        await asyncio.to_thread(get_car_database().upsert_listings, cars)
+        line = json.dumps({"page": page, "cars_found": len(cars), "data": cars}, ensure_ascii=False)
+        # The page count is not known up front when auto-paginating
+        if not await report_progress(pages_done, None if auto_paginate else max_pages, line):
+            lines.append(line)
+    
+    if lines:
+        return [TextContent(type="text", text="\n".join(lines))]
+    batch = CarRecordBatch.concat([page_batches[page] for page in sorted(page_batches)])
+    return [TextContent(
+        type="text",
+        text=json.dumps({
+            "success": True,
+            "pages": pages_done,
+            "cars_found": cars_found,
+            "dataset_id": await asyncio.to_thread(register_dataset, batch)
+        })
+    )]
 
-    # Iterate through potential car ad wrappers
-    for car_wrapper_div in car_item_wrapper_divs: 
-        article_element = car_wrapper_div.find('article', recursive=False)
-        if not article_element:
-            article_element = car_wrapper_div.find('article') 
-            if not article_element:
-                continue
+async def fetch_finn_changes(url: str, max_pages: int = FINN_MAX_PAGES, parser: str = DEFAULT_BACKEND,
+                             fetch_details: bool = True, max_workers: int = DEFAULT_DETAIL_WORKERS):
+    """Scrape a saved search and report what changed since the previous run"""
+    try:
+        all_cars = []
+        crawl = {}
+        async for page, cars in iter_all_search_pages(url, parser, max_pages, crawl):
+            all_cars.extend(cars)
+        await asyncio.to_thread(get_car_database().upsert_listings, all_cars)
         
-        # Initialize dictionary for this potential car
-        car_info = {
-            'name': None,
-            'link': None,
-            'image_url': None,
-            'additional_info': None,
-            'year': None,
-            'mileage': None,
-            'price': None,
-            'age': None,
-            'km_per_year': None
-        }
-
-        # Image URL
-        image_tag = article_element.select_one('div:nth-of-type(2) > div > img')
-        if image_tag:
-            car_info['image_url'] = image_tag.get('src') or image_tag.get('data-src')
-
-        # Main info container
-        info_div = article_element.select_one('div:nth-of-type(3)')
+        # Removals are only trusted when the crawl reached the empty page after the last
+        # listings. Stopping at max_pages or on an empty first page (more likely a block or
+        # layout change than a search without results) may leave listings unseen
+        key = search_key(url)
+        complete = crawl["exhausted"]
+        changes = await asyncio.to_thread(get_listing_state().update, key, all_cars, complete)
         
-        if info_div:
-            # Car Name (Model) and Ad Link
-            name_tag = info_div.find('h2')
-            if name_tag:
-                car_info['name'] = name_tag.get_text(strip=True)
-                link_tag = name_tag.find('a')
-                if link_tag and link_tag.has_attr('href'):
-                    ad_url = link_tag['href']
-                    if ad_url.startswith('/'):
-                        base_url = "https://www.finn.no"
-                        ad_url = base_url + ad_url
-                    car_info['link'] = ad_url
-
-            # Additional Info
-            additional_info_tag = info_div.find('span', class_='text-caption')
-            if additional_info_tag:
-                car_info['additional_info'] = additional_info_tag.get_text(strip=True)
+        # Unchanged and sold listings keep the details from earlier runs
+        details = []
+        if fetch_details:
+            changed_urls = [car["link"] for group in ("new", "price_changed", "changed")
+                            for car in changes[group] if car.get("link")]
+            async for car_details in iter_car_details(changed_urls, max_workers):
+                details.append(car_details)
+        
+        return [TextContent(
+            type="text",
+            text=json.dumps({
+                "success": True,
+                "search_key": key,
+                "cars_found": len(all_cars),
+                **changes,
+                "details": details
+            }, ensure_ascii=False)
+        )]
+        
+    except Exception as e:
+        return [TextContent(
+            type="text", 
+            text=json.dumps({"success": False, "error": str(e)})
+        )]
 
-            # Year and Mileage details
-            details_tag = info_div.select_one('span:nth-of-type(2)')
-            if details_tag:
-                details_text = details_tag.get_text(strip=True)
-                
-                year_match = re.search(r'\b(19\d{2}|20\d{2})\b', details_text)
-                if year_match:
-                    year_str = year_match.group(0)
-                    if year_str.isdigit():
-                        car_info['year'] = int(year_str)
-                        car_info['age'] = current_year - car_info['year']
-                
-                mileage_match = re.search(r'(\d[\d\s.,]*\s*km)\b', details_text, re.IGNORECASE)
-                if mileage_match:
-                    raw_mileage_text = mileage_match.group(1)
-                    mileage_str_cleaned = re.sub(r'[^\d]', '', raw_mileage_text.lower().replace('km', ''))
-                    if mileage_str_cleaned.isdigit():
-                        car_info['mileage'] = int(mileage_str_cleaned)
+# This function extracts detailed information from a specific car listing URL
+async def extract_car_details(car_url: str):
+    """Extract detailed information from individual car listing"""
+    details = await get_car_details(car_url)
+    return [TextContent(
+        type="text",
+        text=json.dumps(details, ensure_ascii=False)
+    )]
 
-            # Calculate km_per_year
-            if car_info['mileage'] is not None and car_info['age'] is not None:
-                if car_info['age'] > 0:
-                    car_info['km_per_year'] = round(car_info['mileage'] / car_info['age'])
-                elif car_info['age'] == 0:
-                    car_info['km_per_year'] = car_info['mileage'] 
-            
-            # Price
-            price_tag = info_div.select_one('div:nth-of-type(1)')
-            if price_tag:
-                price_text = price_tag.get_text(strip=True)
-                if "solgt" in price_text.lower():
-                    car_info['price'] = "Solgt"
-                else:
-                    price_digits = re.sub(r'[^\d]', '', price_text)
-                    if price_digits:
-                        car_info['price'] = int(price_digits)
+async def extract_car_details_batch(car_urls: list, max_workers: int = DEFAULT_DETAIL_WORKERS):
+    """Extract details for many listings concurrently, one result per listing in completion order"""
+    results = []
+    async for details in iter_car_details(car_urls, max_workers):
+        results.append(TextContent(
+            type="text",
+            text=json.dumps(details, ensure_ascii=False)
+        ))
+        await report_progress(len(results), len(car_urls), details.get("url"))
+    return results
 
-        # Only add to list if essential data like name was found
-        if car_info.get('name'): 
-            successful_car_id_counter += 1
-            car_info['id'] = successful_car_id_counter
-            parsed_cars_list.append(car_info)
+async def iter_car_details(car_urls: list, max_workers: int = DEFAULT_DETAIL_WORKERS):
+    """Yield the details of each listing as soon as it has been fetched and enriched"""
+    semaphore = asyncio.Semaphore(max(1, max_workers))
 
-    return parsed_cars_list
+    async def worker(car_url):
+        async with semaphore:
+            return await get_car_details(car_url)
 
+    tasks = [asyncio.create_task(worker(car_url)) for car_url in car_urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding lookups if the consumer bails out early
+        for task in tasks:
+            task.cancel()
 
-# This function extracts detailed information from a specific car listing URL
-async def extract_car_details(car_url: str):
-    """Extract detailed information from individual car listing"""
+async def get_car_details(car_url: str):
+    """Fetch, parse and enrich a single car listing, returning the details dict"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(car_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        # Extract detailed car information
-        details = {
-            "url": car_url,
-            "title": None,
-            "description": None,
-            "specifications": {},
-            "equipment": [],
-            "heftelser_info": {}  # Erstatter seller_info
-        }
-        
-        # Extract title
-        title_tag = soup.find('h1')
-        if title_tag:
-            details["title"] = title_tag.get_text(strip=True)
-        
-        # Extract registration number from specifications for heftelser lookup
-        registration_number = None
-        
-        # Find the main content area
-        main_content = soup.find('main')
-        if main_content:
-            # Look for all sections
-            sections = main_content.find_all('section')
-            
-            for i, section in enumerate(sections):
-                section_text = section.get_text(strip=True).lower()
-                
-                # Extract Description (Beskrivelse) - section[1]
-                if 'beskrivelse' in section_text or 'description' in section_text:
-                    description = extract_description_from_section(section)
-                    if description:
-                        details["description"] = description
-                
-                # Extract Specifications (Spesifikasjoner) - section[2]
-                elif 'spesifikasjoner' in section_text or 'specifications' in section_text:
-                    specs = extract_specifications_from_section(section)
-                    details["specifications"].update(specs)
-                    
-                    # Look for registration number in specifications
-                    for key, value in specs.items():
-                        if 'registreringsnummer' in key.lower() or 'regnr' in key.lower():
-                            registration_number = value
-                
-                # Extract Equipment (Utstyr) - section[3]
-                elif 'utstyr' in section_text or 'equipment' in section_text:
-                    equipment = extract_equipment_from_section(section)
-                    details["equipment"].extend(equipment)
-        
-        # Alternative approach for specs if not found
-        if not details["specifications"]:
-            specs = extract_specifications_alternative(soup)
-            details["specifications"].update(specs)
-            
-            # Look for registration number in alternative specs
-            for key, value in specs.items():
-                if 'registreringsnummer' in key.lower() or 'regnr' in key.lower():
-                    registration_number = value
-        
-        if not details["equipment"]:
-            equipment = extract_equipment_alternative(soup)
-            details["equipment"].extend(equipment)
+        page_html = await get_fetcher().get_text(car_url, source="finn_item")
+        details, registration_number = await asyncio.to_thread(parse_car_details, page_html, car_url)
         
         # Scrape heftelser info if we found a registration number
         if registration_number:
@@ -275,27 +291,65 @@ async def extract_car_details(car_url: str):
             details["heftelser_info"] = heftelser_info
         else:
             details["heftelser_info"] = {"error": "Registreringsnummer ikke funnet"}
-            
-        return [TextContent(
-            type="text",
-            text=json.dumps(details, ensure_ascii=False)
-        )]
+        
+        await asyncio.to_thread(get_car_database().upsert_details, [details])
+        return details
         
     except Exception as e:
-        return [TextContent(
-            type="text",
-            text=json.dumps({"error": str(e), "url": car_url})
-        )]
+        return {"error": str(e), "url": car_url}
+
+async def lookup_enrichment(registration_numbers: list, sources: list = None):
+    """Stored heftelser/EU-kontroll results per source, and the numbers that still need a lookup"""
+    try:
+        store = get_enrichment_store()
+        result = {"success": True}
+        for source in sources or list(SOURCE_MAX_AGE):
+            found = await asyncio.to_thread(store.get_many, source, registration_numbers)
+            result[source] = {
+                "results": found,
+                "missing": [number for number in dict.fromkeys(registration_numbers) if number not in found]
+            }
+        return [TextContent(type="text", text=json.dumps(result, ensure_ascii=False))]
+
+    except Exception as e:
+        return [TextContent(type="text", text=json.dumps({"success": False, "error": str(e)}))]
+
+async def report_progress(progress, total, message=None):
+    """Send an MCP progress notification when the caller asked for progress updates
+
+    Returns whether a notification was sent.
+    """
+    try:
+        ctx = app.request_context
+    except LookupError:
+        return False  # Called outside an MCP request, e.g. from a test script
+    progress_token = ctx.meta.progressToken if ctx.meta else None
+    if progress_token is None:
+        return False
+    await ctx.session.send_progress_notification(progress_token, progress, total, message)
+    return True
 
 async def scrape_heftelser_info(registration_number: str):
+    """Heftelser information for a registration number, from the enrichment store when fresh"""
+    store = get_enrichment_store()
+    heftelser_info = await asyncio.to_thread(store.get, "heftelser", registration_number)
+    if heftelser_info is not None:
+        return heftelser_info
+
+    heftelser_info = await fetch_heftelser_info(registration_number)
+    if heftelser_info.get("status") != "error":
+        await asyncio.to_thread(store.put, "heftelser", registration_number, heftelser_info,
+                                heftelser_info.get("status") != "ikke_funnet")
+    return heftelser_info
+
+async def fetch_heftelser_info(registration_number: str):
     """Scrape heftelser information for a given registration number"""
     try:
         # Construct the heftelser URL (du må angi riktig URL format)
         # Eksempel URL - du må tilpasse dette til riktig format
         heftelser_url = f"https://rettsstiftelser.brreg.no/nb/oppslag/motorvogn/{registration_number}"  # Tilpass URL
         
-        response = requests.get(heftelser_url, timeout=10)
-        response.raise_for_status()
+        response = await get_fetcher().get(heftelser_url, source="heftelser")
         
         tree = html.fromstring(response.content)
         
@@ -331,6 +385,18 @@ async def scrape_heftelser_info(registration_number: str):
         
         return heftelser_info
         
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            return {"registration_number": registration_number, "error": str(e), "status": "error"}
+        # Ukjent registreringsnummer
+        return {
+            "registration_number": registration_number,
+            "has_heftelser": None,
+            "belop": None,
+            "pantsettere": [],
+            "status": "ikke_funnet"
+        }
+
     except Exception as e:
         return {
             "registration_number": registration_number,
@@ -338,113 +404,6 @@ async def scrape_heftelser_info(registration_number: str):
             "status": "error"
         }
 
-# Behold alle de andre hjelpefunksjonene som før...
-def extract_description_from_section(section):
-    """Extract description text from a beskrivelse section"""
-    description = None
-    
-    # Method 1: Look for paragraphs in the section
-    paragraphs = section.find_all('p')
-    if paragraphs:
-        # Combine all paragraphs
-        desc_parts = []
-        for p in paragraphs:
-            text = p.get_text(strip=True)
-            if text and text.lower() != 'beskrivelse':  # Skip the header
-                desc_parts.append(text)
-        if desc_parts:
-            description = ' '.join(desc_parts)
-    
-    # Method 2: Look for divs with text content
-    if not description:
-        divs = section.find_all('div')
-        for div in divs:
-            text = div.get_text(strip=True)
-            if text and len(text) > 20 and text.lower() != 'beskrivelse':
-                # Check if this div doesn't have many nested elements (likely pure text)
-                nested_elements = len(div.find_all(['div', 'span', 'p']))
-                if nested_elements <= 2:  # Allow some nesting but not too much
-                    description = text
-                    break
-    
-    # Method 3: Get all text from section excluding header
-    if not description:
-        all_text = section.get_text(strip=True)
-        # Remove the "Beskrivelse" header if it's at the beginning
-        if all_text.lower().startswith('beskrivelse'):
-            description = all_text[11:].strip()  # Remove "beskrivelse" and clean
-        elif len(all_text) > 20:
-            description = all_text
-    
-    return description if description and len(description) > 10 else None
-
-def extract_specifications_from_section(section):
-    """Extract specifications from a section element"""
-    specs = {}
-    
-    # Look for definition lists (dl/dt/dd structure)
-    dl_elements = section.find_all('dl')
-    for dl in dl_elements:
-        dt_elements = dl.find_all('dt')
-        dd_elements = dl.find_all('dd')
-        
-        for dt, dd in zip(dt_elements, dd_elements):
-            key = dt.get_text(strip=True)
-            value = dd.get_text(strip=True)
-            if key and value:
-                specs[key] = value
-    
-    # Look for table structures
-    tables = section.find_all('table')
-    for table in tables:
-        rows = table.find_all('tr')
-        for row in rows:
-            cells = row.find_all(['td', 'th'])
-            if len(cells) >= 2:
-                key = cells[0].get_text(strip=True)
-                value = cells[1].get_text(strip=True)
-                if key and value:
-                    specs[key] = value
-    
-    # Look for div pairs or similar structures
-    divs = section.find_all('div')
-    for i in range(0, len(divs) - 1, 2):
-        if i + 1 < len(divs):
-            potential_key = divs[i].get_text(strip=True)
-            potential_value = divs[i + 1].get_text(strip=True)
-            
-            # Check if this looks like a key-value pair
-            if (len(potential_key) < 50 and len(potential_value) < 200 and 
-                ':' not in potential_key and potential_key and potential_value):
-                specs[potential_key] = potential_value
-    
-    return specs
-
-def extract_equipment_from_section(section):
-    """Extract equipment list from a section element"""
-    equipment = []
-    
-    # Look for unordered/ordered lists
-    lists = section.find_all(['ul', 'ol'])
-    for ul in lists:
-        items = ul.find_all('li')
-        for item in items:
-            text = item.get_text(strip=True)
-            if text and len(text) < 100:  # Avoid very long text that's not equipment
-                equipment.append(text)
-    
-    # Look for divs that might contain equipment items
-    divs = section.find_all('div')
-    for div in divs:
-        text = div.get_text(strip=True)
-        # Check if this looks like an equipment item (short, descriptive text)
-        if (text and len(text.split()) <= 5 and len(text) < 50 and 
-            not any(char.isdigit() for char in text[:10])):  # Avoid specs that start with numbers
-            if text not in equipment:  # Avoid duplicates
-                equipment.append(text)
-    
-    return equipment
-
 # def extract_seller_info_from_section(section):
 #     """Extract seller information from a section element"""
 #     seller_info = {}
@@ -481,50 +440,6 @@ def extract_equipment_from_section(section):
     
 #     return seller_info
  
-def extract_specifications_alternative(soup):
-    """Alternative method to extract specifications if section-based approach fails"""
-    specs = {}
-    
-    # Look for any element that might contain specifications
-    spec_keywords = ['motor', 'drivstoff', 'girkasse', 'hjuldrift', 'årsmodell', 'kilometer', 
-                    'effekt', 'sylindre', 'co2', 'forbruk', 'toppfart', 'acceleration']
-    
-    for keyword in spec_keywords:
-        # Look for text that contains the keyword followed by a value
-        pattern = rf'{keyword}[:\s]*([^\n\r,]+)'
-        matches = re.findall(pattern, soup.get_text(), re.IGNORECASE)
-        if matches:
-            specs[keyword.capitalize()] = matches[0].strip()
-    
-    return specs
-
-def extract_equipment_alternative(soup):
-    """Alternative method to extract equipment if section-based approach fails"""
-    equipment = []
-    
-    # Common Norwegian car equipment terms
-    equipment_keywords = [
-        'klimaanlegg', 'aircondition', 'cruisecontrol', 'navigasjon', 'gps',
-        'bluetooth', 'dab', 'radio', 'cd', 'mp3', 'usb', 'aux',
-        'elektriske', 'oppvarming', 'kjøling', 'automatisk', 'manuell',
-        'sportsseter', 'skinnseter', 'elektrisk', 'parkeringssensor',
-        'ryggekamera', 'xenon', 'led', 'tåkelys', 'metallic', 'felger'
-    ]
-    
-    soup_text = soup.get_text().lower()
-    
-    for keyword in equipment_keywords:
-        if keyword in soup_text:
-            # Try to extract the full equipment name around the keyword
-            pattern = f'([^.\n]*{keyword}[^.\n]*)'
-            matches = re.findall(pattern, soup_text, re.IGNORECASE)
-            for match in matches:
-                clean_match = match.strip()
-                if 10 < len(clean_match) < 50:  # Reasonable length for equipment item
-                    equipment.append(clean_match.capitalize())
-    
-    return list(set(equipment))  # Remove duplicates
-
 # """ if __name__ == "__main__":
 #     import sys
 #     from mcp.server.stdio import stdio_server